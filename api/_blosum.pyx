@@ -0,0 +1,46 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Compiled BLOSUM62 peptide scan, used by app.py when Numba is not installed
+
+Build in place with:
+    cythonize -i -3 api/_blosum.pyx
+"""
+
+import numpy as np
+
+from libc.stdint cimport int64_t
+
+
+def scan_peptides(const unsigned char[::1] query, const int64_t[::1] query_self_scores,
+                  const unsigned char[::1] db_buf, const int64_t[::1] db_off,
+                  const signed char[:, ::1] table, const int64_t[::1] rows):
+    """Score the query against the sequences in db_buf listed in rows"""
+    cdef Py_ssize_t n = rows.shape[0]
+    cdef Py_ssize_t query_len = query.shape[0]
+    cdef Py_ssize_t i, j, k, start, db_len, min_len, max_len
+    cdef int64_t score, max_possible_score
+    cdef double similarity
+
+    sims = np.zeros(n, dtype=np.float64)
+    cdef double[::1] out = sims
+
+    with nogil:
+        for j in range(n):
+            i = rows[j]
+            start = db_off[i]
+            db_len = db_off[i + 1] - start
+            min_len = query_len if query_len < db_len else db_len
+            max_len = query_len if query_len > db_len else db_len
+            if min_len == 0:
+                continue
+
+            score = 0
+            for k in range(min_len):
+                score += table[query[k], db_buf[start + k]]
+
+            max_possible_score = query_self_scores[min_len - 1]
+            if max_possible_score > 0:
+                similarity = (<double>score / max_possible_score) * 100 * (<double>min_len / max_len)
+                out[j] = similarity if similarity > 0 else 0.0
+
+    return sims
@@ -4,16 +4,31 @@ Only handles DIAMOND (peptide) and BLAT (codon) similarity searches
 Keyword search handled by frontend using sql.js
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, send_file
 from flask_cors import CORS
 import subprocess
 import tempfile
 import os
+import shutil
 import sqlite3
 import hashlib
-import json
+import gzip
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 import time
+import threading
+from urllib.request import pathname2url
+import numpy as np
+import orjson
+
+from blosum import BLOSUM_TABLE, BLOSUM_DIAG, AA_INDEX
+
+try:
+    import edlib
+    _EDLIB_AVAILABLE = True
+except ImportError:
+    _EDLIB_AVAILABLE = False
 
 app = Flask(__name__)
 
@@ -39,7 +54,7 @@ def add_cors_headers(response):
 def handle_preflight():
     """Handle OPTIONS preflight requests"""
     if request.method == "OPTIONS":
-        response = jsonify({"status": "ok"})
+        response = ojsonify({"status": "ok"})
         response.headers["Access-Control-Allow-Origin"] = "*"
         response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
         response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
@@ -47,11 +62,24 @@ def handle_preflight():
         return response, 200
 
 # Configuration
-# CRITICAL: Use /tmp for cache directory (only writable directory in Vercel)
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tmrna.db')
 DIAMOND_DB = os.environ.get('DIAMOND_DB', 'peptide_db')
 BLAT_DB = os.environ.get('BLAT_DB', 'codons.fasta')
-CACHE_DIR = '/tmp/cache'  # CHANGED: Use /tmp instead of 'cache'
+CACHE_DIR = '/tmp/cache'  # Search responses shared across workers and restarts
+CACHE_SIZE = 256  # Max cached search responses per process
+MAX_RESULTS = 500  # Max hits returned by a similarity search
+PEPTIDE_KMER = 3  # k-mer length of the peptide prefilter index
+CODON_KMER = 8  # k-mer length of the codon prefilter index
+SQL_BATCH = 900  # Identifiers per IN (...) query, under SQLite's bound-variable limit
+FETCH_SIZE = 8192  # Rows per fetchmany() chunk when loading a corpus
+
+# tmrna_data columns returned with every search hit; the frontend's CSV export writes them all
+RESULT_COLUMNS = (
+    'id', 'identifier', 'tag_peptide', 'codons', 'tmrna_sequence',
+    'organism_name', 'accession', 'peptide_length', 'sequence_length'
+)
+_RESULT_SELECT = ', '.join(RESULT_COLUMNS)
+SCAN_BLOCK = 8192  # Candidate rows per task when a NumPy scan is split across threads
 
 # Create cache directory (only if it doesn't exist)
 try:
@@ -64,54 +92,12 @@ except Exception as e:
 # Utility Functions
 # ============================================
 
-BLOSUM62 = {
-    ('A', 'A'): 4,  ('A', 'R'): -1, ('A', 'N'): -2, ('A', 'D'): -2, ('A', 'C'): 0,
-    ('A', 'Q'): -1, ('A', 'E'): -1, ('A', 'G'): 0,  ('A', 'H'): -2, ('A', 'I'): -1,
-    ('A', 'L'): -1, ('A', 'K'): -1, ('A', 'M'): -1, ('A', 'F'): -2, ('A', 'P'): -1,
-    ('A', 'S'): 1,  ('A', 'T'): 0,  ('A', 'W'): -3, ('A', 'Y'): -2, ('A', 'V'): 0,
-    ('R', 'R'): 5,  ('R', 'N'): 0,  ('R', 'D'): -2, ('R', 'C'): -3, ('R', 'Q'): 1,
-    ('R', 'E'): 0,  ('R', 'G'): -2, ('R', 'H'): 0,  ('R', 'I'): -3, ('R', 'L'): -2,
-    ('R', 'K'): 2,  ('R', 'M'): -1, ('R', 'F'): -3, ('R', 'P'): -2, ('R', 'S'): -1,
-    ('R', 'T'): -1, ('R', 'W'): -3, ('R', 'Y'): -2, ('R', 'V'): -3, ('N', 'N'): 6,
-    ('N', 'D'): 1,  ('N', 'C'): -3, ('N', 'Q'): 0,  ('N', 'E'): 0,  ('N', 'G'): 0,
-    ('N', 'H'): 1,  ('N', 'I'): -3, ('N', 'L'): -3, ('N', 'K'): 0,  ('N', 'M'): -2,
-    ('N', 'F'): -3, ('N', 'P'): -2, ('N', 'S'): 1,  ('N', 'T'): 0,  ('N', 'W'): -4,
-    ('N', 'Y'): -2, ('N', 'V'): -3, ('D', 'D'): 6,  ('D', 'C'): -3, ('D', 'Q'): 0,
-    ('D', 'E'): 2,  ('D', 'G'): -1, ('D', 'H'): -1, ('D', 'I'): -3, ('D', 'L'): -4,
-    ('D', 'K'): -1, ('D', 'M'): -3, ('D', 'F'): -3, ('D', 'P'): -1, ('D', 'S'): 0,
-    ('D', 'T'): -1, ('D', 'W'): -4, ('D', 'Y'): -3, ('D', 'V'): -3, ('C', 'C'): 9,
-    ('C', 'Q'): -3, ('C', 'E'): -4, ('C', 'G'): -3, ('C', 'H'): -3, ('C', 'I'): -1,
-    ('C', 'L'): -1, ('C', 'K'): -3, ('C', 'M'): -1, ('C', 'F'): -2, ('C', 'P'): -3,
-    ('C', 'S'): -1, ('C', 'T'): -1, ('C', 'W'): -2, ('C', 'Y'): -2, ('C', 'V'): -1,
-    ('Q', 'Q'): 5,  ('Q', 'E'): 2,  ('Q', 'G'): -2, ('Q', 'H'): 0,  ('Q', 'I'): -3,
-    ('Q', 'L'): -2, ('Q', 'K'): 1,  ('Q', 'M'): 0,  ('Q', 'F'): -3, ('Q', 'P'): -1,
-    ('Q', 'S'): 0,  ('Q', 'T'): -1, ('Q', 'W'): -2, ('Q', 'Y'): -1, ('Q', 'V'): -2,
-    ('E', 'E'): 5,  ('E', 'G'): -2, ('E', 'H'): 0,  ('E', 'I'): -3, ('E', 'L'): -3,
-    ('E', 'K'): 1,  ('E', 'M'): -2, ('E', 'F'): -3, ('E', 'P'): -1, ('E', 'S'): 0,
-    ('E', 'T'): -1, ('E', 'W'): -3, ('E', 'Y'): -2, ('E', 'V'): -2, ('G', 'G'): 6,
-    ('G', 'H'): -2, ('G', 'I'): -4, ('G', 'L'): -4, ('G', 'K'): -2, ('G', 'M'): -3,
-    ('G', 'F'): -3, ('G', 'P'): -2, ('G', 'S'): 0,  ('G', 'T'): -2, ('G', 'W'): -2,
-    ('G', 'Y'): -3, ('G', 'V'): -3, ('H', 'H'): 8,  ('H', 'I'): -3, ('H', 'L'): -3,
-    ('H', 'K'): -1, ('H', 'M'): -2, ('H', 'F'): -1, ('H', 'P'): -2, ('H', 'S'): -1,
-    ('H', 'T'): -2, ('H', 'W'): -2, ('H', 'Y'): 2,  ('H', 'V'): -3, ('I', 'I'): 4,
-    ('I', 'L'): 2,  ('I', 'K'): -3, ('I', 'M'): 1,  ('I', 'F'): 0,  ('I', 'P'): -3,
-    ('I', 'S'): -2, ('I', 'T'): -1, ('I', 'W'): -3, ('I', 'Y'): -1, ('I', 'V'): 3,
-    ('L', 'L'): 4,  ('L', 'K'): -2, ('L', 'M'): 2,  ('L', 'F'): 0,  ('L', 'P'): -3,
-    ('L', 'S'): -2, ('L', 'T'): -1, ('L', 'W'): -2, ('L', 'Y'): -1, ('L', 'V'): 1,
-    ('K', 'K'): 5,  ('K', 'M'): -1, ('K', 'F'): -3, ('K', 'P'): -1, ('K', 'S'): 0,
-    ('K', 'T'): -1, ('K', 'W'): -3, ('K', 'Y'): -2, ('K', 'V'): -2, ('M', 'M'): 5,
-    ('M', 'F'): 0,  ('M', 'P'): -2, ('M', 'S'): -1, ('M', 'T'): -1, ('M', 'W'): -1,
-    ('M', 'Y'): -1, ('M', 'V'): 1,  ('F', 'F'): 6,  ('F', 'P'): -4, ('F', 'S'): -2,
-    ('F', 'T'): -2, ('F', 'W'): 1,  ('F', 'Y'): 3,  ('F', 'V'): -1, ('P', 'P'): 7,
-    ('P', 'S'): -1, ('P', 'T'): -1, ('P', 'W'): -4, ('P', 'Y'): -3, ('P', 'V'): -2,
-    ('S', 'S'): 4,  ('S', 'T'): 1,  ('S', 'W'): -3, ('S', 'Y'): -2, ('S', 'V'): -2,
-    ('T', 'T'): 5,  ('T', 'W'): -2, ('T', 'Y'): -2, ('T', 'V'): 0,  ('W', 'W'): 11,
-    ('W', 'Y'): 2,  ('W', 'V'): -3, ('Y', 'Y'): 7,  ('Y', 'V'): -1, ('V', 'V'): 4
-}
+# Per-thread read-only connections, each with the DB mtime it was opened against
+_DB_LOCAL = threading.local()
 
 
 def get_db_connection():
-    """Create SQLite database connection"""
+    """Return this thread's read-only SQLite connection, reopening it if the DB file changed"""
     if not os.path.exists(DB_PATH):
         print(f"❌ ERROR: Database not found at {DB_PATH}")
         print(f"📁 Current directory: {os.getcwd()}")
@@ -119,65 +105,202 @@ def get_db_connection():
         print(f"📁 Files in directory: {os.listdir(os.path.dirname(os.path.abspath(__file__)))}")
         raise FileNotFoundError(f"Database not found at {DB_PATH}")
     
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    mtime = get_db_mtime()
+    conn = getattr(_DB_LOCAL, 'conn', None)
+    if conn is None or _DB_LOCAL.mtime != mtime:
+        close_db_connection()
+        conn = sqlite3.connect(f"file:{pathname2url(DB_PATH)}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        conn.executescript('''
+            PRAGMA mmap_size = 268435456;
+            PRAGMA cache_size = -65536;
+            PRAGMA query_only = 1;
+        ''')
+        _DB_LOCAL.conn, _DB_LOCAL.mtime = conn, mtime
+    
     return conn
 
 
+def close_db_connection():
+    """Close this thread's connection, if it has one"""
+    conn = getattr(_DB_LOCAL, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _DB_LOCAL.conn = None
+
+
+# Cleaned DB sequences, loaded on first use and reloaded when the DB file changes.
+# Each is a dict holding the DB mtime it was loaded from plus the corpus data.
+_PEPTIDE_CACHE = None
+_CODON_CACHE = None
+_CORPUS_LOCK = threading.Lock()
+
+
+def get_db_mtime():
+    """Modification time of the database file, used to invalidate in-memory data"""
+    return os.stat(DB_PATH).st_mtime_ns
+
+
+def ojsonify(obj, status=200):
+    """Like jsonify, but serialized with orjson"""
+    return app.response_class(orjson.dumps(obj), status=status, mimetype='application/json')
+
+
+# Serialized search responses: cache_key -> (timestamp, gzipped JSON body), oldest first
+_RESPONSE_CACHE = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def gzip_json_response(blob):
+    """Send a gzipped JSON body as-is if the client accepts gzip, otherwise decompressed"""
+    if request.accept_encodings['gzip'] > 0:
+        response = app.response_class(blob, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(gzip.decompress(blob), mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def remember_response(cache_key, entry):
+    """Add a (timestamp, blob) entry to the in-memory response LRU"""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[cache_key] = entry
+        _RESPONSE_CACHE.move_to_end(cache_key)
+        while len(_RESPONSE_CACHE) > CACHE_SIZE:
+            _RESPONSE_CACHE.popitem(last=False)
+
+
+def read_cache_file(cache_key):
+    """Return the (timestamp, blob) entry persisted in CACHE_DIR, or None"""
+    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json.gz")
+    try:
+        with open(cache_file, 'rb') as file_handle:
+            return os.fstat(file_handle.fileno()).st_mtime, file_handle.read()
+    except OSError:
+        return None
+
+
+def write_cache_file(cache_key, blob):
+    """Persist a gzipped body to CACHE_DIR via a temp file and os.replace, so readers never see a partial file"""
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file_handle:
+            file_handle.write(blob)
+        os.replace(tmp_path, os.path.join(CACHE_DIR, f"{cache_key}.json.gz"))
+    except OSError as e:
+        print(f"⚠️ Could not write cache file: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
 def cache_result(timeout=3600):
-    """Decorator to cache API results"""
+    """
+    Decorator to cache API results, keyed by request and DB version
+
+    Responses live in an in-memory LRU backed by gzipped files in CACHE_DIR,
+    so a restarted or sibling worker can still serve them. On a miss the
+    JSON body is parsed once and passed to the view as data.
+    """
     def decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             try:
-                # Only use cache if CACHE_DIR exists and is writable
-                if os.path.exists(CACHE_DIR) and os.access(CACHE_DIR, os.W_OK):
-                    cache_key = hashlib.md5(
-                        f"{f.__name__}:{json.dumps(request.get_json(), sort_keys=True)}".encode()
-                    ).hexdigest()
-                    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-                    
-                    if os.path.exists(cache_file):
-                        cache_age = time.time() - os.path.getmtime(cache_file)
-                        if cache_age < timeout:
-                            with open(cache_file, 'r') as file_handle:
-                                print("✅ Returning response from FILE CACHE")
-                                return jsonify(json.load(file_handle))
-                    
-                    result = f(*args, **kwargs)
-                    
-                    if result.status_code == 200 and result.is_json:
-                        try:
-                            with open(cache_file, 'w') as file_handle:
-                                json.dump(result.get_json(), file_handle)
-                        except Exception as e:
-                            print(f"⚠️ Warning: Could not write cache: {e}")
-                    
-                    return result
-                else:
-                    # Cache not available, just run the function
-                    return f(*args, **kwargs)
+                # cache=True keeps the body around for the view's request.get_json()
+                body = request.get_data(cache=True) or b''
+                cache_key = hashlib.blake2b(
+                    f"{f.__name__}:{get_db_mtime()}|".encode() + body, digest_size=16
+                ).hexdigest()
             except Exception as e:
                 print(f"⚠️ Cache error: {e}, running without cache")
                 return f(*args, **kwargs)
+            
+            with _RESPONSE_CACHE_LOCK:
+                cached = _RESPONSE_CACHE.get(cache_key)
+                if cached is not None and time.time() - cached[0] < timeout:
+                    _RESPONSE_CACHE.move_to_end(cache_key)
+                    print("✅ Returning response from MEMORY CACHE")
+                    return gzip_json_response(cached[1])
+            
+            cached = read_cache_file(cache_key)
+            if cached is not None and time.time() - cached[0] < timeout:
+                remember_response(cache_key, cached)
+                print("✅ Returning response from DISK CACHE")
+                return gzip_json_response(cached[1])
+            
+            # Hand the view the parsed body; anything that isn't clean JSON is
+            # left to the view's own request.get_json() error handling
+            if request.is_json and body:
+                try:
+                    kwargs['data'] = orjson.loads(body)
+                except orjson.JSONDecodeError:
+                    pass
+            
+            result = f(*args, **kwargs)
+            
+            if isinstance(result, Response) and result.status_code == 200 and result.is_json:
+                blob = gzip.compress(result.get_data(), compresslevel=1)
+                remember_response(cache_key, (time.time(), blob))
+                write_cache_file(cache_key, blob)
+                return gzip_json_response(blob)
+            
+            return result
         return wrapper
     return decorator
 
 
+def etag_by_db(max_age=60):
+    """
+    Decorator for GET endpoints whose response only changes with the database file
+
+    Tags responses with an ETag derived from the DB mtime and answers a matching
+    If-None-Match with 304 before running the view.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+            
+            try:
+                etag = f"{get_db_mtime():x}"
+            except OSError:
+                return f(*args, **kwargs)
+            
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = f(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = f'public, max-age={max_age}'
+            return response
+        return wrapper
+    return decorator
+
+
+# Characters dropped by the sequence cleaners, applied in a single str.translate pass
+_PEPTIDE_STRIP = str.maketrans('', '', '?* \n\t\r')
+_CODON_STRIP = str.maketrans('', '', '- \n\t\r')
+
+
 def clean_peptide_sequence(sequence):
     """Clean peptide sequence by removing special characters"""
-    return sequence.replace('?', '').replace('*', '').replace(' ', '').replace('\n', '').strip().upper()
+    return sequence.translate(_PEPTIDE_STRIP).upper()
 
 
 def clean_codon_sequence(sequence):
     """Clean codon sequence by removing hyphens and spaces"""
-    return sequence.replace('-', '').replace(' ', '').replace('\n', '').strip().lower()
+    return sequence.translate(_CODON_STRIP).lower()
 
 
 @app.route('/', methods=['GET'])
 def index():
     """Root endpoint - API information"""
-    return jsonify({
+    return ojsonify({
         'message': 'tmRNA Database API',
         'status': 'online',
         'version': '1.0',
@@ -194,7 +317,7 @@ def index():
 @app.route('/api', methods=['GET'])
 def api_index():
     """API base endpoint"""
-    return jsonify({
+    return ojsonify({
         'message': 'tmRNA Database API',
         'status': 'online',
         'version': '1.0',
@@ -216,10 +339,11 @@ def health_check():
     if request.method == 'OPTIONS':
         return '', 204
     
-    return jsonify({
+    return ojsonify({
         'status': 'healthy',
         'database': os.path.exists(DB_PATH),
-        'cache_available': os.path.exists(CACHE_DIR) and os.access(CACHE_DIR, os.W_OK)
+        'cache_available': os.path.exists(CACHE_DIR) and os.access(CACHE_DIR, os.W_OK),
+        'cached_responses': len(_RESPONSE_CACHE)
     })
 
 
@@ -228,6 +352,7 @@ def health_check():
 # ============================================
 
 @app.route('/api/info', methods=['GET', 'OPTIONS'])
+@etag_by_db(max_age=60)
 def database_info():
     """Get database statistics"""
     if request.method == 'OPTIONS':
@@ -243,15 +368,13 @@ def database_info():
         cursor.execute('SELECT COUNT(DISTINCT organism_name) FROM tmrna_data WHERE organism_name != ""')
         unique_organisms = cursor.fetchone()[0]
         
-        conn.close()
-        
-        return jsonify({
+        return ojsonify({
             'total_records': total_records,
             'unique_organisms': unique_organisms,
             'database_size_mb': os.path.getsize(DB_PATH) / (1024 * 1024)
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, status=500)
 
 
 # ============================================
@@ -260,30 +383,37 @@ def database_info():
 
 def get_blosum_score(aa1, aa2):
     """Get BLOSUM62 score for two amino acids"""
-    aa1, aa2 = aa1.upper(), aa2.upper()
-    if (aa1, aa2) in BLOSUM62:
-        return BLOSUM62[(aa1, aa2)]
-    elif (aa2, aa1) in BLOSUM62:
-        return BLOSUM62[(aa2, aa1)]
-    else:
+    i = ord(aa1.upper()) - 65
+    j = ord(aa2.upper()) - 65
+    if not (0 <= i < 26 and 0 <= j < 26):
         return -4
+    return int(BLOSUM_TABLE[i, j])
+
 
+def encode_peptide(sequence):
+    """Encode a cleaned peptide as BLOSUM_TABLE indices"""
+    return AA_INDEX[np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)]
 
-def calculate_peptide_similarity_blosum(seq1, seq2):
-    """Calculate peptide similarity using BLOSUM62 matrix"""
+
+def calculate_peptide_similarity_blosum(seq1, seq2, seq1_self_scores=None):
+    """
+    Calculate peptide similarity using BLOSUM62 matrix
+
+    seq1 and seq2 are encoded with encode_peptide(). seq1_self_scores is the
+    cumulative sum of seq1's self-scores, so callers scoring one query against
+    many sequences only compute it once.
+    """
     min_len = min(len(seq1), len(seq2))
     max_len = max(len(seq1), len(seq2))
     
     if min_len == 0:
         return 0.0
     
-    score = 0
-    max_possible_score = 0
+    if seq1_self_scores is None:
+        seq1_self_scores = np.cumsum(BLOSUM_DIAG[seq1])
     
-    for i in range(min_len):
-        blosum_score = get_blosum_score(seq1[i], seq2[i])
-        score += blosum_score
-        max_possible_score += get_blosum_score(seq1[i], seq1[i])
+    score = int(BLOSUM_TABLE[seq1[:min_len], seq2[:min_len]].sum())
+    max_possible_score = int(seq1_self_scores[min_len - 1])
     
     length_penalty = min_len / max_len
     
@@ -295,28 +425,429 @@ def calculate_peptide_similarity_blosum(seq1, seq2):
     return max(0.0, similarity)
 
 
+# NumPy releases the GIL inside its gather/compare kernels, so row blocks scored
+# on separate threads run in parallel
+_SCAN_THREADS = os.cpu_count() or 1
+_SCAN_POOL = ThreadPoolExecutor(max_workers=_SCAN_THREADS)
+
+
+def scan_in_blocks(scan, *args):
+    """
+    Call scan(*args, rows) on SCAN_BLOCK-sized slices of rows across _SCAN_POOL
+
+    rows is the last argument, as in scan_peptides() and scan_codons(); the
+    per-block similarities are concatenated back in row order.
+    """
+    *args, rows = args
+    if len(rows) <= SCAN_BLOCK or _SCAN_THREADS == 1:
+        return scan(*args, rows)
+    
+    blocks = [rows[start:start + SCAN_BLOCK] for start in range(0, len(rows), SCAN_BLOCK)]
+    return np.concatenate(list(_SCAN_POOL.map(lambda block: scan(*args, block), blocks)))
+
+
+def _scan_peptides_python(query, query_self_scores, db_buf, db_off, table, rows):
+    """
+    Score the query against the sequences in db_buf listed in rows (NumPy fallback)
+
+    The rows are gathered into one padded (rows x overlap width) matrix and
+    scored with a single table lookup; positions past each row's min_len
+    are masked out of the sums.
+    """
+    sims = np.zeros(len(rows), dtype=np.float64)
+    if len(rows) == 0 or len(query) == 0 or len(db_buf) == 0:
+        return sims
+    
+    starts = db_off[rows]
+    db_lens = db_off[rows + 1] - starts
+    min_lens = np.minimum(db_lens, len(query))
+    max_lens = np.maximum(db_lens, len(query))
+    
+    # No row overlaps the query past its longest candidate
+    width = min(len(query), int(db_lens.max()))
+    positions = np.arange(width)
+    padded = db_buf[np.minimum(starts[:, None] + positions, len(db_buf) - 1)]
+    
+    # Gather int8 scores, zero them past each row's overlap in place, and sum
+    # with an int32 accumulator
+    gathered = table[query[None, :width], padded]
+    gathered[positions >= min_lens[:, None]] = 0
+    scores = np.add.reduce(gathered, axis=1, dtype=np.int32)
+    
+    valid = min_lens > 0
+    max_possible_scores = np.zeros(len(rows), dtype=np.int64)
+    max_possible_scores[valid] = query_self_scores[min_lens[valid] - 1]
+    valid &= max_possible_scores > 0
+    
+    similarity = (scores[valid] / max_possible_scores[valid]) * 100 * (min_lens[valid] / max_lens[valid])
+    sims[valid] = np.maximum(similarity, 0.0)
+    return sims
+
+
+try:
+    # Numba parallelizes over rows itself with prange
+    from fast_blosum import scan_peptides, warm_up
+except ImportError:
+    warm_up = None
+    
+    try:
+        # Optional Cython build of the same kernel, see _blosum.pyx
+        from _blosum import scan_peptides as _scan_peptides_block
+    except ImportError:
+        _scan_peptides_block = _scan_peptides_python
+    
+    def scan_peptides(query, query_self_scores, db_buf, db_off, table, rows):
+        """Score the query against the sequences in db_buf listed in rows, in parallel row blocks"""
+        return scan_in_blocks(_scan_peptides_block, query, query_self_scores, db_buf, db_off, table, rows)
+
+
+def pack_sequences(encoded):
+    """Concatenate encoded sequences into one buffer plus an offsets array"""
+    db_off = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(seq) for seq in encoded], out=db_off[1:])
+    db_buf = np.concatenate(encoded) if encoded else np.zeros(0, dtype=np.uint8)
+    return db_buf, db_off
+
+
+def encode_batch(sequences, encode):
+    """Encode a list of sequences with a single encode() call, returning one array view per sequence"""
+    if not sequences:
+        return []
+    bounds = np.cumsum([len(seq) for seq in sequences])[:-1]
+    return np.split(encode(''.join(sequences)), bounds)
+
+
+def build_kmer_index(sequences, k):
+    """Map every k-mer to a sorted int32 array of the sequences containing it"""
+    postings = defaultdict(list)
+    
+    for i, seq in enumerate(sequences):
+        raw = seq.tobytes()
+        for kmer in {raw[j:j + k] for j in range(len(raw) - k + 1)}:
+            postings[kmer].append(i)
+    
+    return {kmer: np.array(ids, dtype=np.int32) for kmer, ids in postings.items()}
+
+
+def kmer_candidates(query, kmer_index, k, rows, admitted):
+    """
+    Indices of the sequences worth scoring
+
+    rows lists the sequences that can pass at all, and admitted marks those
+    among them that must be scored regardless of seeding. The rest are kept
+    if they share a k-mer with the query; the posting lists are skipped
+    entirely when nothing is left to seed.
+    """
+    if admitted.all():
+        return rows
+    
+    raw = query.tobytes()
+    postings = [
+        kmer_index[kmer]
+        for kmer in {raw[j:j + k] for j in range(len(raw) - k + 1)}
+        if kmer in kmer_index
+    ]
+    
+    if not postings:
+        return rows[admitted]
+    
+    seeded = np.zeros(rows.max(initial=-1) + 1, dtype=bool)
+    postings = np.concatenate(postings)
+    seeded[postings[postings < len(seeded)]] = True
+    return rows[admitted | seeded[rows]]
+
+
+def fetch_rows(identifiers):
+    """
+    Fetch the result columns for a list of identifiers
+
+    Returns a dict keyed by identifier of fresh {column: value} dicts, built
+    straight from plain tuples rather than through sqlite3.Row.
+    """
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = None
+    identifier_col = RESULT_COLUMNS.index('identifier')
+    by_id = {}
+    
+    for start in range(0, len(identifiers), SQL_BATCH):
+        batch = identifiers[start:start + SQL_BATCH]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'SELECT {_RESULT_SELECT} FROM tmrna_data WHERE identifier IN ({placeholders})', batch)
+        for row in cursor:
+            by_id[row[identifier_col]] = dict(zip(RESULT_COLUMNS, row))
+    
+    return by_id
+
+
+def select_top_hits(indices, sims, limit=MAX_RESULTS):
+    """
+    Keep the best `limit` hits, as (indices, rounded similarities)
+
+    Hits are ordered by similarity rounded to 2 decimals, ties in DB order,
+    which is how results have always been sorted. Only hits that can reach
+    the top `limit` are rounded and sorted.
+    """
+    if len(sims) > limit:
+        cutoff = np.partition(sims, len(sims) - limit)[len(sims) - limit]
+        # Anything within 0.01 of the cutoff may still round into a tie with it
+        keep = sims >= cutoff - 0.01
+        indices, sims = indices[keep], sims[keep]
+    
+    rounded = np.array([round(similarity, 2) for similarity in sims.tolist()], dtype=np.float64)
+    order = np.argsort(-rounded, kind='stable')[:limit]
+    return indices[order], rounded[order]
+
+
+def get_peptide_corpus():
+    """
+    Return the peptide corpus: every DB peptide of at least 3 residues
+
+    The dict holds parallel arrays (an object array of identifiers, the
+    packed db_buf/db_off encoding and its lengths), length_order and
+    sorted_lengths for range lookups by length, the k-mer prefilter
+    index, and row_index, which maps the first word of each identifier (the
+    sequence ID DIAMOND reports) to its position. Full rows are only fetched
+    for the hits, see fetch_rows().
+    """
+    global _PEPTIDE_CACHE
+    
+    mtime = get_db_mtime()
+    with _CORPUS_LOCK:
+        if _PEPTIDE_CACHE is None or _PEPTIDE_CACHE['mtime'] != mtime:
+            print("📥 Loading peptide sequences into memory...")
+            
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT identifier, tag_peptide FROM tmrna_data')
+            
+            identifiers = []
+            encoded = []
+            
+            while True:
+                chunk = cursor.fetchmany(FETCH_SIZE)
+                if not chunk:
+                    break
+                
+                cleaned = []
+                for identifier, tag_peptide in chunk:
+                    db_seq = clean_peptide_sequence(tag_peptide)
+                    
+                    if len(db_seq) < 3:
+                        continue
+                    
+                    identifiers.append(identifier)
+                    cleaned.append(db_seq)
+                
+                encoded.extend(encode_batch(cleaned, encode_peptide))
+            
+            db_buf, db_off = pack_sequences(encoded)
+            lengths = np.diff(db_off)
+            length_order = np.argsort(lengths, kind='stable')
+            _PEPTIDE_CACHE = {
+                'mtime': mtime,
+                'identifiers': np.array(identifiers, dtype=object),
+                'db_buf': db_buf,
+                'db_off': db_off,
+                'lengths': lengths,
+                'length_order': length_order,
+                'sorted_lengths': lengths[length_order],
+                'kmer_index': build_kmer_index(encoded, PEPTIDE_KMER),
+                'row_index': {identifier.split()[0]: i for i, identifier in enumerate(identifiers)}
+            }
+        
+        return _PEPTIDE_CACHE
+
+
+def parse_diamond_output(output, threshold):
+    """
+    Parse DIAMOND tabular output (--outfmt 6)
+
+    BLAT's -out=blast8 uses the same 12-column layout, so codon search
+    parses its output here too.
+
+    Returns the best hit per subject with percent identity >= threshold,
+    in the order DIAMOND reported them.
+    """
+    hits = []
+    seen = set()
+    
+    for line in output.splitlines():
+        fields = line.split('\t')
+        if len(fields) < 12:
+            continue
+        
+        subject_id = fields[1]
+        identity = float(fields[2])
+        
+        if subject_id in seen or identity < threshold:
+            continue
+        
+        seen.add(subject_id)
+        hits.append({
+            'subject_id': subject_id,
+            'identity': identity,
+            'alignment_length': int(fields[3]),
+            'e_value': float(fields[10]),
+            'bit_score': float(fields[11])
+        })
+    
+    return hits
+
+
+def run_diamond_search(clean_seq, threshold):
+    """
+    Search the DIAMOND database for a cleaned peptide
+
+    Returns the result rows, or None if DIAMOND failed so the caller can fall
+    back to the Python BLOSUM62 scan.
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.fa', delete=False) as query_file:
+        query_file.write(f">query\n{clean_seq}\n")
+    
+    try:
+        proc = subprocess.run([
+            'diamond', 'blastp',
+            '-d', DIAMOND_DB,
+            '-q', query_file.name,
+            '--outfmt', '6',
+            '-k', str(MAX_RESULTS),
+            # 10-20 aa peptides rarely reach a strict e-value even when
+            # identical; hits are filtered by identity afterwards
+            '--evalue', '1000',
+            '--threads', str(max(2, os.cpu_count() or 2)),
+            '--ultra-sensitive'
+        ], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ DIAMOND failed: {e}")
+        return None
+    finally:
+        os.remove(query_file.name)
+    
+    if proc.returncode != 0:
+        print(f"⚠️ DIAMOND failed: {proc.stderr.strip()}")
+        return None
+    
+    corpus = get_peptide_corpus()
+    hits = [
+        (corpus['identifiers'][corpus['row_index'][hit['subject_id']]], hit)
+        for hit in parse_diamond_output(proc.stdout, threshold)
+        if hit['subject_id'] in corpus['row_index']
+    ]
+    by_id = fetch_rows([identifier for identifier, _ in hits])
+    results = []
+    
+    for identifier, hit in hits:
+        result_dict = by_id[identifier]
+        result_dict['similarity'] = round(hit['identity'], 2)
+        result_dict['e_value'] = hit['e_value']
+        result_dict['algorithm'] = 'DIAMOND'
+        results.append(result_dict)
+    
+    return results
+
+
+def length_window(corpus, query_len, threshold):
+    """
+    Indices, in DB order, of the peptides whose length ratio to the query can still reach threshold
+
+    BLOSUM62 similarity never exceeds the length penalty 100 * shorter / longer,
+    and the lengths passing that bound form one contiguous range, so it is
+    looked up in the length-sorted order instead of testing every row.
+    """
+    sorted_lengths = corpus['sorted_lengths']
+    candidate_lengths = np.arange(sorted_lengths[-1] + 1 if len(sorted_lengths) else 0)
+    ratio = 100 * (np.minimum(candidate_lengths, query_len) / np.maximum(candidate_lengths, query_len))
+    allowed = np.flatnonzero(ratio >= threshold)
+    
+    if len(allowed) == 0:
+        return np.zeros(0, dtype=np.int64)
+    
+    start = np.searchsorted(sorted_lengths, allowed[0], side='left')
+    end = np.searchsorted(sorted_lengths, allowed[-1], side='right')
+    return np.sort(corpus['length_order'][start:end])
+
+
+def peptide_unseeded_bound(query, query_self_scores, lengths, k):
+    """
+    Upper bound on the BLOSUM62 similarity of sequences sharing no k-mer with the query
+
+    Without a shared k-mer every aligned k-residue block holds at least one
+    substitution, and a substitution at query position i costs at least the
+    gap between that residue's self-score and its best substitution score.
+    """
+    query_len = len(query)
+    self_scores = BLOSUM_DIAG[query].astype(np.int64)
+    substitutions = BLOSUM_TABLE[query].astype(np.int64)
+    substitutions[np.arange(query_len), query] = np.iinfo(np.int8).min
+    min_loss = self_scores - substitutions.max(axis=1)
+    
+    n_blocks = query_len // k
+    block_loss = min_loss[:n_blocks * k].reshape(n_blocks, k).min(axis=1)
+    cum_loss = np.concatenate(([0], np.cumsum(block_loss)))
+    
+    min_len = np.minimum(lengths, query_len)
+    max_len = np.maximum(lengths, query_len)
+    max_possible_score = query_self_scores[min_len - 1]
+    best_score = max_possible_score - cum_loss[min_len // k]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bound = (best_score / max_possible_score) * 100 * (min_len / max_len)
+    return np.where(max_possible_score > 0, np.maximum(bound, 0.0), 0.0)
+
+
+def blosum_top_hits(corpus, query, threshold):
+    """
+    Best BLOSUM62 hits of an encoded query in the peptide corpus, as select_top_hits() returns them
+
+    Only the length window is scored, and within it only sequences sharing a
+    k-mer with the query plus any whose length still lets them reach the
+    threshold without one; the result is the same as scoring every row.
+    """
+    query_self_scores = np.cumsum(BLOSUM_DIAG[query])
+    eligible = length_window(corpus, len(query), threshold)
+    
+    unseeded = peptide_unseeded_bound(
+        query, query_self_scores, corpus['lengths'][eligible], PEPTIDE_KMER
+    ) >= threshold
+    candidates = kmer_candidates(query, corpus['kmer_index'], PEPTIDE_KMER, eligible, unseeded)
+    sims = scan_peptides(
+        query, query_self_scores, corpus['db_buf'], corpus['db_off'], BLOSUM_TABLE, candidates
+    )
+    
+    hits = sims >= threshold
+    return select_top_hits(candidates[hits], sims[hits])
+
+
+def diamond_available():
+    """Whether the DIAMOND binary and database are present"""
+    return shutil.which('diamond') is not None and (
+        os.path.exists(DIAMOND_DB) or os.path.exists(f"{DIAMOND_DB}.dmnd")
+    )
+
+
 @app.route('/api/search/peptide', methods=['POST', 'OPTIONS'])
 @cache_result(timeout=3600)
-def search_peptide():
-    """Peptide similarity search using BLOSUM62"""
+def search_peptide(data=None):
+    """Peptide similarity search using DIAMOND, or BLOSUM62 when DIAMOND is unavailable"""
     if request.method == 'OPTIONS':
         return '', 204
     
     start_time = time.time()
     
     try:
-        data = request.get_json()
+        if data is None:
+            data = request.get_json()
         
         if not data:
-            return jsonify({'error': 'No JSON data provided'}), 400
+            return ojsonify({'error': 'No JSON data provided'}, status=400)
 
         sequence = data.get('sequence', '')
         threshold = float(data.get('threshold', 50.0))
 
         if not sequence:
-            return jsonify({'error': 'Sequence is required'}), 400
+            return ojsonify({'error': 'Sequence is required'}, status=400)
 
-        clean_seq = sequence.replace('?', '').replace('*', '').replace(' ', '').replace('\n', '').strip().upper()
+        clean_seq = clean_peptide_sequence(sequence)
         
         print(f"🔍 Input sequence: {sequence}")
         print(f"🧹 Cleaned sequence: {clean_seq}")
@@ -324,161 +855,361 @@ def search_peptide():
         print(f"🎯 Threshold: {threshold}%")
 
         if len(clean_seq) < 3:
-            return jsonify({'error': 'Sequence too short (minimum 3 amino acids)'}), 400
+            return ojsonify({'error': 'Sequence too short (minimum 3 amino acids)'}, status=400)
 
-        print(f"🔍 Searching database with BLOSUM62 algorithm...")
+        results = None
+        algorithm = 'DIAMOND blastp'
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT identifier, tag_peptide FROM tmrna_data')
-        all_sequences = cursor.fetchall()
+        if diamond_available():
+            print("🔍 Searching database with DIAMOND...")
+            results = run_diamond_search(clean_seq, threshold)
         
-        results = []
-        processed = 0
-        
-        for row in all_sequences:
-            identifier = row['identifier']
-            peptide = row['tag_peptide']
-            
-            db_seq = peptide.replace('?', '').replace('*', '').strip().upper()
+        # None means DIAMOND failed; an empty list can also just mean its
+        # seeding missed short peptides, which the BLOSUM62 scan still finds
+        if not results:
+            print("🔍 Searching database with BLOSUM62 algorithm...")
+            algorithm = 'Python BLOSUM62'
             
-            if len(db_seq) < 3:
-                continue
+            corpus = get_peptide_corpus()
+            top, top_sims = blosum_top_hits(corpus, encode_peptide(clean_seq), threshold)
             
-            similarity = calculate_peptide_similarity_blosum(clean_seq, db_seq)
+            top_ids = corpus['identifiers'][top].tolist()
+            by_id = fetch_rows(top_ids)
+            results = []
             
-            if similarity >= threshold:
-                cursor.execute('SELECT * FROM tmrna_data WHERE identifier = ?', (identifier,))
-                full_row = cursor.fetchone()
-                
-                if full_row:
-                    result_dict = dict(full_row)
-                    result_dict['similarity'] = round(similarity, 2)
-                    result_dict['e_value'] = 'N/A'
-                    result_dict['algorithm'] = 'BLOSUM62'
-                    results.append(result_dict)
-            
-            processed += 1
-            if processed % 10000 == 0:
-                print(f"   Processed {processed:,} sequences...")
-        
-        conn.close()
-        
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        results = results[:500]
+            for identifier, similarity in zip(top_ids, top_sims.tolist()):
+                result_dict = by_id[identifier]
+                result_dict['similarity'] = similarity
+                result_dict['e_value'] = 'N/A'
+                result_dict['algorithm'] = 'BLOSUM62'
+                results.append(result_dict)
+        else:
+            results.sort(key=lambda x: x['similarity'], reverse=True)
+            results = results[:MAX_RESULTS]
         
         search_time = time.time() - start_time
         
         print(f"✅ Found {len(results)} matches in {search_time:.2f}s")
         
-        return jsonify({
+        return ojsonify({
             'results': results,
             'total': len(results),
             'search_time': round(search_time, 2),
             'query_length': len(clean_seq),
             'threshold': threshold,
-            'algorithm': 'Python BLOSUM62'
+            'algorithm': algorithm
         })
     
     except Exception as e:
         import traceback
         print(f"❌ Error in peptide search: {e}")
         print(traceback.format_exc())
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, status=500)
 
 
 # ============================================
 # Codon Similarity Search
 # ============================================
 
+def encode_codons(sequence):
+    """Encode a codon sequence as case-folded ASCII bytes"""
+    return np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8) | 0x20
+
+
 def calculate_nucleotide_similarity(seq1, seq2):
-    """Calculate simple nucleotide similarity"""
+    """
+    Calculate simple nucleotide similarity
+
+    seq1 and seq2 are encoded with encode_codons().
+    """
     min_len = min(len(seq1), len(seq2))
     
     if min_len == 0:
         return 0.0
     
-    matches = sum(1 for i in range(min_len) if seq1[i].lower() == seq2[i].lower())
+    matches = int(np.count_nonzero(seq1[:min_len] == seq2[:min_len]))
     similarity = (matches / min_len) * 100
     
     return similarity
 
 
+def pad_sequences(sequences, lengths):
+    """Stack encoded sequences into a zero-padded (N x longest) uint8 matrix"""
+    matrix = np.zeros((len(sequences), lengths.max(initial=0)), dtype=np.uint8)
+    if sequences:
+        matrix[np.arange(matrix.shape[1]) < lengths[:, None]] = np.concatenate(sequences)
+    return matrix
+
+
+def scan_codons(query, matrix, lengths, rows):
+    """
+    Nucleotide similarity of the query against the matrix rows listed in rows
+
+    Same result as calculate_nucleotide_similarity() per row, computed with
+    one vectorized compare. Padding bytes are 0 and never match an encoded
+    query, so positions past a row's length need no mask.
+    """
+    width = min(len(query), matrix.shape[1])
+    matches = np.count_nonzero(matrix[rows, :width] == query[None, :width], axis=1)
+    min_lens = np.minimum(lengths[rows], len(query))
+    
+    sims = np.zeros(len(rows), dtype=np.float64)
+    valid = min_lens > 0
+    sims[valid] = (matches[valid] / min_lens[valid]) * 100
+    return sims
+
+
+def get_codon_corpus():
+    """
+    Return the codon corpus: every DB row with its encoded codon sequence
+
+    The dict holds parallel arrays (an object array of identifiers, the
+    zero-padded sequence matrix and the sequence lengths), the k-mer
+    prefilter index, and row_index, which maps the first word of each
+    identifier (the sequence ID BLAT reports) to its position. Full rows are
+    only fetched for the hits, see fetch_rows().
+    """
+    global _CODON_CACHE
+    
+    mtime = get_db_mtime()
+    with _CORPUS_LOCK:
+        if _CODON_CACHE is None or _CODON_CACHE['mtime'] != mtime:
+            print("📥 Loading codon sequences into memory...")
+            
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT identifier, codons FROM tmrna_data')
+            
+            identifiers = []
+            sequences = []
+            
+            while True:
+                chunk = cursor.fetchmany(FETCH_SIZE)
+                if not chunk:
+                    break
+                
+                identifiers.extend(identifier for identifier, _ in chunk)
+                sequences.extend(encode_batch(
+                    [clean_codon_sequence(codons) for _, codons in chunk], encode_codons
+                ))
+            
+            lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+            _CODON_CACHE = {
+                'mtime': mtime,
+                'identifiers': np.array(identifiers, dtype=object),
+                'matrix': pad_sequences(sequences, lengths),
+                'lengths': lengths,
+                'kmer_index': build_kmer_index(sequences, CODON_KMER),
+                'row_index': {identifier.split()[0]: i for i, identifier in enumerate(identifiers)}
+            }
+        
+        return _CODON_CACHE
+
+
+def run_blat_search(clean_seq, threshold):
+    """
+    Search the BLAT codon FASTA for a cleaned codon sequence
+
+    Returns the result rows, or None if BLAT failed so the caller can fall
+    back to the Python nucleotide scan.
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.fa', delete=False) as query_file:
+        query_file.write(f">query\n{clean_seq}\n")
+    
+    # BLAT's defaults (-minScore=30, two 11-base tile hits) can never report
+    # a query much under 30 nt; hits are filtered by identity afterwards, so
+    # drop the score floor and seed short queries with one smaller tile
+    tuning = ['-minScore=0']
+    if len(clean_seq) < 30:
+        tuning += ['-minMatch=1', f'-tileSize={max(6, len(clean_seq) // 2)}']
+    
+    try:
+        # BLAT treats the output name 'stdout' specially; its status lines
+        # on stdout are skipped by the 12-column parser
+        proc = subprocess.run([
+            'blat', BLAT_DB, query_file.name,
+            '-out=blast8',
+            f'-minIdentity={int(threshold)}',
+            *tuning,
+            'stdout'
+        ], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ BLAT failed: {e}")
+        return None
+    finally:
+        os.remove(query_file.name)
+    
+    if proc.returncode != 0:
+        print(f"⚠️ BLAT failed: {proc.stderr.strip()}")
+        return None
+    
+    corpus = get_codon_corpus()
+    hits = [
+        (corpus['identifiers'][corpus['row_index'][hit['subject_id']]], hit)
+        for hit in parse_diamond_output(proc.stdout, threshold)
+        if hit['subject_id'] in corpus['row_index']
+    ]
+    by_id = fetch_rows([identifier for identifier, _ in hits])
+    results = []
+    
+    for identifier, hit in hits:
+        result_dict = by_id[identifier]
+        result_dict['similarity'] = round(hit['identity'], 2)
+        result_dict['e_value'] = hit['e_value']
+        results.append(result_dict)
+    
+    return results
+
+
+def codon_unseeded_bound(query_len, lengths, k):
+    """
+    Upper bound on the nucleotide similarity of sequences sharing no k-mer with the query
+
+    Without a shared k-mer every aligned k-base block holds at least one mismatch.
+    """
+    min_len = np.minimum(lengths, query_len)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bound = ((min_len - min_len // k) / min_len) * 100
+    return np.where(min_len > 0, bound, 0.0)
+
+
+def scan_codons_edit(query, matrix, lengths, rows):
+    """
+    Edit-distance similarity of the query against the matrix rows listed in rows
+
+    The whole query is aligned anywhere inside each sequence (edlib mode='HW'),
+    and the distance is scaled by the longer of the two lengths.
+    """
+    raw = query.tobytes()
+    sims = np.zeros(len(rows), dtype=np.float64)
+    
+    for j, i in enumerate(rows.tolist()):
+        target = matrix[i, :lengths[i]].tobytes()
+        distance = edlib.align(raw, target, mode='HW', task='distance')['editDistance']
+        sims[j] = (1 - distance / max(len(raw), len(target))) * 100
+    
+    return sims
+
+
+def codon_edit_bounds(query_len, lengths, k):
+    """
+    Upper bounds on the edit-distance similarity, as (any sequence, sequences sharing no k-mer)
+
+    Fitting the whole query into a shorter sequence costs at least the length
+    difference, and without a shared k-mer each of the query's query_len // k
+    blocks holds at least one edit.
+    """
+    max_len = np.maximum(lengths, query_len)
+    min_edits = np.maximum(query_len - lengths, 0)
+    
+    bound = (1 - min_edits / max_len) * 100
+    unseeded_bound = (1 - np.maximum(min_edits, query_len // k) / max_len) * 100
+    return bound, unseeded_bound
+
+
+def blat_available():
+    """Whether the BLAT binary and codon FASTA are present"""
+    return shutil.which('blat') is not None and os.path.exists(BLAT_DB)
+
+
 @app.route('/api/search/codon', methods=['POST', 'OPTIONS'])
 @cache_result(timeout=3600)
-def search_codon():
-    """Codon similarity search using simple nucleotide alignment"""
+def search_codon(data=None):
+    """Codon similarity search using BLAT, or simple nucleotide alignment when BLAT is unavailable"""
     if request.method == 'OPTIONS':
         return '', 204
     
     start_time = time.time()
     
     try:
-        data = request.get_json()
+        if data is None:
+            data = request.get_json()
         
         if not data:
-            return jsonify({'error': 'No JSON data provided'}), 400
+            return ojsonify({'error': 'No JSON data provided'}, status=400)
         
         sequence = data.get('sequence', '')
         threshold = float(data.get('threshold', 50.0))
+        scoring = data.get('scoring', 'position')
         
         if not sequence:
-            return jsonify({'error': 'Sequence is required'}), 400
+            return ojsonify({'error': 'Sequence is required'}, status=400)
+        
+        if scoring not in ('position', 'edit'):
+            return ojsonify({'error': "scoring must be 'position' or 'edit'"}, status=400)
+        
+        if scoring == 'edit' and not _EDLIB_AVAILABLE:
+            return ojsonify({'error': 'Edit distance scoring requires edlib'}, status=400)
         
         clean_seq = clean_codon_sequence(sequence)
         
         if len(clean_seq) < 15:
-            return jsonify({'error': 'Sequence too short (minimum 15 nucleotides)'}), 400
+            return ojsonify({'error': 'Sequence too short (minimum 15 nucleotides)'}, status=400)
         
         print(f"🔍 Searching for codon similarity with threshold {threshold}%...")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT identifier, codons FROM tmrna_data')
-        all_sequences = cursor.fetchall()
+        results = None
+        algorithm = 'BLAT'
         
-        results = []
+        if scoring == 'position' and blat_available():
+            results = run_blat_search(clean_seq, threshold)
         
-        for row in all_sequences:
-            identifier = row['identifier']
-            codons = row['codons']
+        # None means BLAT failed; an empty list can also just mean its seeding
+        # missed short or divergent hits, which the exact scan still finds
+        if not results:
+            query = encode_codons(clean_seq)
+            corpus = get_codon_corpus()
             
-            db_seq = clean_codon_sequence(codons)
-            similarity = calculate_nucleotide_similarity(clean_seq, db_seq)
+            # Only score sequences sharing a k-mer with the query, plus any whose
+            # length still lets them reach the threshold without one
+            if scoring == 'edit':
+                algorithm = 'edlib Edit Distance'
+                scan = scan_codons_edit
+                bound, unseeded_bound = codon_edit_bounds(len(query), corpus['lengths'], CODON_KMER)
+                eligible = np.flatnonzero(bound >= threshold)
+                unseeded = unseeded_bound[eligible] >= threshold
+            else:
+                algorithm = 'Simple Nucleotide Alignment'
+                scan = scan_codons
+                eligible = np.arange(len(corpus['identifiers']))
+                unseeded = codon_unseeded_bound(len(query), corpus['lengths'], CODON_KMER) >= threshold
             
-            if similarity >= threshold:
-                cursor.execute('SELECT * FROM tmrna_data WHERE identifier = ?', (identifier,))
-                full_row = cursor.fetchone()
-                
-                if full_row:
-                    result_dict = dict(full_row)
-                    result_dict['similarity'] = round(similarity, 2)
-                    result_dict['e_value'] = 'N/A'
-                    results.append(result_dict)
-        
-        conn.close()
-        
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        results = results[:500]
+            candidates = kmer_candidates(query, corpus['kmer_index'], CODON_KMER, eligible, unseeded)
+            
+            sims = scan_in_blocks(scan, query, corpus['matrix'], corpus['lengths'], candidates)
+            hits = sims >= threshold
+            top, top_sims = select_top_hits(candidates[hits], sims[hits])
+            
+            top_ids = corpus['identifiers'][top].tolist()
+            by_id = fetch_rows(top_ids)
+            results = []
+            
+            for identifier, similarity in zip(top_ids, top_sims.tolist()):
+                result_dict = by_id[identifier]
+                result_dict['similarity'] = similarity
+                result_dict['e_value'] = 'N/A'
+                results.append(result_dict)
+        else:
+            results.sort(key=lambda x: x['similarity'], reverse=True)
+            results = results[:MAX_RESULTS]
         
         search_time = time.time() - start_time
         
         print(f"✅ Found {len(results)} matches in {search_time:.2f}s")
         
-        return jsonify({
+        return ojsonify({
             'results': results,
             'total': len(results),
             'search_time': round(search_time, 2),
             'query_length': len(clean_seq),
             'threshold': threshold,
-            'algorithm': 'Simple Nucleotide Alignment'
+            'algorithm': algorithm
         })
     
     except Exception as e:
         print(f"❌ Error in codon search: {e}")
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, status=500)
 
 
 # ============================================
@@ -487,12 +1218,52 @@ def search_codon():
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({'error': 'Endpoint not found'}), 404
+    return ojsonify({'error': 'Endpoint not found'}, status=404)
 
 
 @app.errorhandler(500)
 def internal_error(error):
-    return jsonify({'error': 'Internal server error'}), 500
+    return ojsonify({'error': 'Internal server error'}, status=500)
+
+
+# ============================================
+# Startup
+# ============================================
+
+def preload_corpora():
+    """
+    Load both sequence corpora ahead of the first search
+
+    Called from the on_starting hook in gunicorn.conf.py, so under --preload
+    it runs once in the master and the forked workers share the NumPy
+    buffers copy-on-write. Not run at import, which would slow every
+    serverless cold start; there the corpora load lazily on first use. The
+    loading connection is closed afterwards because SQLite connections must
+    not cross a fork.
+    """
+    if not os.path.exists(DB_PATH):
+        return
+    
+    try:
+        get_peptide_corpus()
+        get_codon_corpus()
+    except Exception as e:
+        print(f"⚠️ Warning: Could not preload sequences: {e}")
+    finally:
+        close_db_connection()
+
+
+def warm_up_kernels():
+    """
+    Compile the Numba peptide kernel ahead of the first search
+
+    Not run at import: compiling starts the threading layer's thread pool,
+    which doesn't survive a fork, so gunicorn workers call this from the
+    post_fork hook in gunicorn.conf.py instead of inheriting it from the
+    --preload master.
+    """
+    if warm_up is not None:
+        warm_up(BLOSUM_TABLE)
 
 
 # ============================================
@@ -500,6 +1271,12 @@ def internal_error(error):
 # ============================================
 
 if __name__ == '__main__':
+    if not os.environ.get('DEV'):
+        print("Run the API under a WSGI server, for example:")
+        print("  gunicorn app:app --workers 2 --worker-class gthread --threads 4 --preload --bind 0.0.0.0:8000")
+        print("or set DEV=1 to start the Flask development server.")
+        raise SystemExit(1)
+    
     if not os.path.exists(DB_PATH):
         print(f"⚠️  Warning: Database file not found: {DB_PATH}")
     
@@ -515,4 +1292,5 @@ if __name__ == '__main__':
     print("  POST /api/search/codon   - Codon similarity")
     print("\n✨ Server ready! Press Ctrl+C to stop.\n")
     
+    warm_up_kernels()
     app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Numba-compiled BLOSUM62 peptide scan, used by app.py when numba is installed
+Importing this module raises ImportError without numba, or when neither of
+Numba's thread-safe threading layers (TBB, OpenMP) can be loaded
+"""
+
+import numpy as np
+import numba
+from numba import config, njit, prange, types
+
+# gthread workers call the kernel from several threads at once, which aborts
+# Numba's workqueue layer, so only accept TBB or OpenMP. app.py falls back to
+# the Cython/NumPy scan on ImportError.
+_LAYER_BACKENDS = {'tbb': ('tbb',), 'omp': ('omp',), 'safe': ('tbb',), 'threadsafe': ('tbb', 'omp')}
+if config.THREADING_LAYER not in _LAYER_BACKENDS:
+    config.THREADING_LAYER = 'threadsafe'
+
+
+def _backend_loadable(backend):
+    """
+    Whether Numba could load this threading backend, checked the way its
+    layer selection does but without launching the thread pool, which must
+    not exist yet when gunicorn --preload forks the workers
+    """
+    try:
+        if backend == 'tbb':
+            from numba.np.ufunc.parallel import _check_tbb_version_compatible
+            _check_tbb_version_compatible()
+            from numba.np.ufunc import tbbpool  # noqa: F401
+        else:
+            from numba.np.ufunc import omppool  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+if not any(_backend_loadable(backend) for backend in _LAYER_BACKENDS[config.THREADING_LAYER]):
+    raise ImportError('no thread-safe Numba threading layer (TBB or OpenMP) is available')
+
+
+@njit(parallel=True, cache=True)
+def scan_peptides(query, query_self_scores, db_buf, db_off, table, rows):
+    """Score the query against the sequences in db_buf listed in rows, one row per thread"""
+    n = rows.shape[0]
+    sims = np.zeros(n, dtype=np.float64)
+    for j in prange(n):
+        i = rows[j]
+        start = db_off[i]
+        db_len = db_off[i + 1] - start
+        min_len = min(query.shape[0], db_len)
+        max_len = max(query.shape[0], db_len)
+        if min_len == 0:
+            continue
+        score = 0
+        for k in range(min_len):
+            score += table[query[k], db_buf[start + k]]
+        max_possible_score = query_self_scores[min_len - 1]
+        if max_possible_score > 0:
+            similarity = (score / max_possible_score) * 100 * (min_len / max_len)
+            sims[j] = max(0.0, similarity)
+    return sims
+
+
+def warm_up(table):
+    """
+    Compile scan_peptides for the argument types search_peptide passes, so the
+    first request doesn't pay for it
+
+    Only compiles: running the prange loop here would start the threading
+    layer's pool in the gunicorn --preload master, and OpenMP/TBB pools don't
+    survive the fork into the workers.
+    """
+    u8 = types.Array(types.uint8, 1, 'C')
+    i64 = types.Array(types.int64, 1, 'C')
+    scan_peptides.compile((u8, i64, u8, i64, types.Array(numba.from_dtype(table.dtype), 2, 'C'), i64))
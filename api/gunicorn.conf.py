@@ -0,0 +1,19 @@
+"""
+gunicorn settings, picked up automatically when gunicorn is started from api/
+"""
+
+
+def on_starting(server):
+    # With --preload the app is already imported here, in the master, so the
+    # corpora loaded now are shared copy-on-write by every forked worker
+    if server.cfg.preload_app:
+        from app import preload_corpora
+        preload_corpora()
+
+
+def post_fork(server, worker):
+    # Compile the Numba kernel inside each worker; doing it in the --preload
+    # master would leave the workers with a thread pool that didn't survive
+    # the fork (see app.warm_up_kernels)
+    from app import warm_up_kernels
+    warm_up_kernels()
@@ -3,7 +3,10 @@ Vercel Serverless Entry Point
 This file exposes the Flask app to Vercel's Python runtime
 """
 
-from app import app
+from app import app, warm_up_kernels
+
+# Serverless instances never fork, so the kernel can be compiled right away
+warm_up_kernels()
 
 # Vercel looks for either 'app' or 'handler'
 # Export the Flask app instance
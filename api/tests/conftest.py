@@ -0,0 +1,5 @@
+import os
+import sys
+
+# app.py imports its sibling modules (blosum, fast_blosum) by plain name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
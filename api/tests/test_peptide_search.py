@@ -0,0 +1,162 @@
+"""
+The k-mer and length pruning in the BLOSUM62 peptide search must be lossless:
+blosum_top_hits() has to return exactly what scoring every row would.
+"""
+
+import numpy as np
+import pytest
+
+from app import (
+    MAX_RESULTS, PEPTIDE_KMER, BLOSUM_DIAG, BLOSUM_TABLE,
+    blosum_top_hits, build_kmer_index, encode_peptide, kmer_candidates,
+    pack_sequences, peptide_unseeded_bound, scan_peptides, select_top_hits,
+)
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+def make_corpus(peptides):
+    """The arrays get_peptide_corpus() builds, from a list of peptide strings"""
+    encoded = [encode_peptide(peptide) for peptide in peptides]
+    db_buf, db_off = pack_sequences(encoded)
+    lengths = np.diff(db_off)
+    length_order = np.argsort(lengths, kind='stable')
+    return {
+        'db_buf': db_buf,
+        'db_off': db_off,
+        'lengths': lengths,
+        'length_order': length_order,
+        'sorted_lengths': lengths[length_order],
+        'kmer_index': build_kmer_index(encoded, PEPTIDE_KMER),
+    }
+
+
+def brute_force_top_hits(corpus, query, threshold):
+    """Score every row and rank by rounded similarity, ties in DB order"""
+    rows = np.arange(len(corpus['lengths']))
+    sims = scan_peptides(
+        query, np.cumsum(BLOSUM_DIAG[query]), corpus['db_buf'], corpus['db_off'], BLOSUM_TABLE, rows
+    )
+    hits = sorted(
+        (i for i in rows.tolist() if sims[i] >= threshold),
+        key=lambda i: (-round(float(sims[i]), 2), i)
+    )[:MAX_RESULTS]
+    return hits, [round(float(sims[i]), 2) for i in hits]
+
+
+def kmers(peptide):
+    return {peptide[j:j + PEPTIDE_KMER] for j in range(len(peptide) - PEPTIDE_KMER + 1)}
+
+
+def random_peptide(rng, length):
+    return ''.join(rng.choice(list(AMINO_ACIDS), size=length))
+
+
+def mutate(rng, peptide, rate):
+    residues = [
+        rng.choice(list(AMINO_ACIDS)) if rng.random() < rate else residue
+        for residue in peptide
+    ]
+    # Trim or extend now and then so hits span the length window too
+    if rng.random() < 0.3:
+        residues = residues[:max(1, len(residues) - int(rng.integers(1, 4)))]
+    elif rng.random() < 0.3:
+        residues += list(random_peptide(rng, int(rng.integers(1, 4))))
+    return ''.join(residues)
+
+
+@pytest.fixture(scope='module')
+def peptides():
+    rng = np.random.default_rng(0)
+    tags = [random_peptide(rng, int(length)) for length in rng.integers(3, 25, size=12)]
+    tags += ['ANDENYALAA', 'ANDNYALAA', 'AKQNNYALAA']
+    
+    peptides = [
+        mutate(rng, tags[int(rng.integers(len(tags)))], rate)
+        for rate in rng.choice([0.0, 0.1, 0.3, 0.6], size=3000)
+    ]
+    # Sequences shorter than k have no k-mers to seed on
+    peptides += [random_peptide(rng, int(length)) for length in rng.integers(1, PEPTIDE_KMER, size=60)]
+    # More identical copies than MAX_RESULTS, spread through the DB, so the
+    # cutoff falls inside a tie
+    peptides += ['ANDENYALAA'] * (MAX_RESULTS + 200)
+    rng.shuffle(peptides)
+    return peptides
+
+
+@pytest.fixture(scope='module')
+def corpus(peptides):
+    return make_corpus(peptides)
+
+
+@pytest.mark.parametrize('query', [
+    'ANDENYALAA', 'ANDNYALAA', 'AKQNNYALAA', 'WWCCHHMMPPWWCC',
+    'AND', 'YAL', 'WCH',  # as short as search_peptide allows, a single k-mer
+    'AN', 'W',  # shorter than k, so nothing can be seeded
+])
+@pytest.mark.parametrize('threshold', [0.0, 30.0, 50.0, 70.0, 100.0])
+def test_pruned_search_matches_brute_force(corpus, query, threshold):
+    encoded = encode_peptide(query)
+    top, top_sims = blosum_top_hits(corpus, encoded, threshold)
+    
+    expected, expected_sims = brute_force_top_hits(corpus, encoded, threshold)
+    assert top.tolist() == expected
+    assert top_sims.tolist() == expected_sims
+
+
+@pytest.mark.parametrize('query', ['ANDENYALAA', 'AND', 'AN', 'WBWBW'])
+def test_kmer_candidates_keeps_admitted_and_seeded_rows(corpus, peptides, query):
+    rng = np.random.default_rng(2)
+    rows = np.flatnonzero(rng.random(len(peptides)) < 0.5)
+    
+    for admitted_rate in (0.0, 0.3, 1.0):
+        admitted = rng.random(len(rows)) < admitted_rate
+        candidates = kmer_candidates(
+            encode_peptide(query), corpus['kmer_index'], PEPTIDE_KMER, rows, admitted
+        )
+        
+        expected = [
+            row for row, admit in zip(rows.tolist(), admitted.tolist())
+            if admit or kmers(peptides[row]) & kmers(query)
+        ]
+        assert candidates.tolist() == expected
+
+
+@pytest.mark.parametrize('query', ['ANDENYALAA', 'ANDNYALAA', 'AKQNNYALAA', 'AND', 'AN'])
+def test_unseeded_bound_is_an_upper_bound(corpus, peptides, query):
+    # Rows sharing no k-mer with the query are only scored if this bound
+    # reaches the threshold, so it must never undershoot their similarity
+    encoded = encode_peptide(query)
+    query_self_scores = np.cumsum(BLOSUM_DIAG[encoded])
+    rows = np.array([
+        i for i, peptide in enumerate(peptides) if not kmers(peptide) & kmers(query)
+    ])
+    
+    bound = peptide_unseeded_bound(encoded, query_self_scores, corpus['lengths'][rows], PEPTIDE_KMER)
+    sims = scan_peptides(
+        encoded, query_self_scores, corpus['db_buf'], corpus['db_off'], BLOSUM_TABLE, rows
+    )
+    assert (bound >= sims).all()
+
+
+def test_cutoff_tie_keeps_db_order(corpus, peptides):
+    top, top_sims = blosum_top_hits(corpus, encode_peptide('ANDENYALAA'), 90.0)
+    
+    copies = [i for i, peptide in enumerate(peptides) if peptide == 'ANDENYALAA']
+    assert len(top) == MAX_RESULTS
+    assert top.tolist() == copies[:MAX_RESULTS]
+    assert set(top_sims.tolist()) == {100.0}
+
+
+def test_select_top_hits_keeps_near_cutoff_rounding_ties():
+    # 79.996 and 80.004 both round to 80.0, so the 500th hit is decided by
+    # DB order, not by the unrounded value the partition sees
+    rng = np.random.default_rng(1)
+    sims = rng.choice([90.0, 80.004, 79.996, 79.5], size=2000)
+    indices = np.arange(len(sims)) * 3
+    
+    top, top_sims = select_top_hits(indices, sims)
+    
+    order = sorted(range(len(sims)), key=lambda i: (-round(sims[i], 2), i))[:MAX_RESULTS]
+    assert top.tolist() == indices[order].tolist()
+    assert top_sims.tolist() == [round(sims[i], 2) for i in order]
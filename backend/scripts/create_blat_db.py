@@ -10,6 +10,22 @@ import sqlite3
 import os
 import sys
 
+# FASTA output is accumulated and written in chunks of this many bytes
+WRITE_BUFFER = 1 << 20
+
+# SQLite cleans each codon sequence (drops hyphens and whitespace, lowercases)
+# and formats the FASTA record itself, so Python only copies bytes out
+FASTA_QUERY = '''
+    SELECT printf('>%s' || char(10) || '%s' || char(10), identifier, clean_codons)
+    FROM (
+        SELECT identifier,
+               lower(replace(replace(replace(replace(replace(
+                   codons, '-', ''), ' ', ''), char(10), ''), char(9), ''), char(13), '')) AS clean_codons
+        FROM tmrna_data
+    )
+    WHERE clean_codons <> ''
+'''
+
 def create_blat_database(db_file='tmrna.db', output_file='codons.fasta'):
     """
     Create FASTA file for BLAT codon similarity search
@@ -29,38 +45,35 @@ def create_blat_database(db_file='tmrna.db', output_file='codons.fasta'):
     
     # Connect to SQLite database
     conn = sqlite3.connect(db_file)
+    conn.execute('PRAGMA cache_size = -65536')
     cursor = conn.cursor()
     
-    # Fetch all codon sequences
+    # Stream codon sequences straight into the FASTA file. A plain table scan
+    # already returns rows in id order, so no ORDER BY is needed.
     print("📥 Extracting codon sequences from database...")
-    cursor.execute('''
-        SELECT identifier, codons 
-        FROM tmrna_data 
-        ORDER BY id
-    ''')
-    
-    sequences = cursor.fetchall()
-    conn.close()
+    print(f"📝 Writing FASTA file: {output_file}")
+    sequence_count = cursor.execute('SELECT COUNT(*) FROM tmrna_data').fetchone()[0]
+    cursor.execute(FASTA_QUERY)
     
-    print(f"✅ Found {len(sequences):,} codon sequences")
+    buf = bytearray()
+    with open(output_file, 'wb', buffering=WRITE_BUFFER) as f:
+        for (record,) in cursor:
+            buf += record.encode()
+            if len(buf) >= WRITE_BUFFER:
+                f.write(buf)
+                buf.clear()
+        f.write(buf)
     
-    # Create FASTA file
-    print(f"📝 Writing FASTA file: {output_file}")
+    conn.close()
     
-    with open(output_file, 'w') as f:
-        for identifier, codons in sequences:
-            # Clean codon sequence (remove hyphens and spaces)
-            clean_codons = codons.replace('-', '').replace(' ', '').strip().lower()
-            
-            if clean_codons:  # Only write if sequence is not empty
-                f.write(f">{identifier}\n{clean_codons}\n")
+    print(f"✅ Found {sequence_count:,} codon sequences")
     
     file_size_mb = os.path.getsize(output_file) / (1024 * 1024)
     
     print("\n" + "="*50)
     print("✅ BLAT DATABASE CREATED SUCCESSFULLY!")
     print("="*50)
-    print(f"📊 Sequences indexed: {len(sequences):,}")
+    print(f"📊 Sequences indexed: {sequence_count:,}")
     print(f"💾 File size: {file_size_mb:.2f} MB")
     print(f"📁 Location: {os.path.abspath(output_file)}")
     print("="*50)
@@ -9,46 +9,121 @@ Requires: DIAMOND installed (download from https://github.com/bbuchfink/diamond)
 
 import sqlite3
 import subprocess
+import gzip
 import os
+import shutil
 import sys
-import re
+import tempfile
+import time
+from collections import deque
+from functools import partial
+from multiprocessing import Pool
 
-def is_valid_protein_sequence(seq):
+# Standard 20 amino acids
+VALID_AA = b'ACDEFGHIKLMNPQRSTVWY'
+
+# Every byte that is not an (uppercase) standard amino acid, for bytes.translate
+_NON_AA = bytes(c for c in range(256) if c not in VALID_AA)
+
+# Rows handed to each cleaning worker at a time
+BATCH_SIZE = 10000
+
+# Batches queued per worker process; bounds how much of the table is in memory
+BATCHES_PER_WORKER = 2
+
+# Skipped sequences listed in the summary; the rest are only counted
+MAX_SKIPPED_SAMPLES = 20
+
+# FASTA output is accumulated and written in chunks of this many bytes
+WRITE_BUFFER = 1 << 20
+
+# `diamond version` output is reused for a day, or until the binary changes
+VERSION_CACHE = os.path.expanduser('~/.diamond_version_cache')
+VERSION_CACHE_TTL = 24 * 60 * 60
+
+# DIAMOND gets every core; its default thread count may leave some idle
+DIAMOND_THREADS = str(max(1, os.cpu_count() or 1))
+
+
+def clean_peptide_sequence(sequence):
     """
-    Check if sequence contains only valid amino acid letters
-    Valid: ACDEFGHIKLMNPQRSTVWY
+    Clean peptide sequence down to the standard amino acids, as ASCII bytes
+
+    Uppercases, then deletes every other byte in a single translate pass, so
+    the result is valid by construction.
     """
-    # Standard 20 amino acids
-    valid_aa = set('ACDEFGHIKLMNPQRSTVWY')
-    seq_upper = seq.upper()
-    
-    # Check if all characters are valid amino acids
-    return all(c in valid_aa for c in seq_upper) and len(seq_upper) > 0
+    return sequence.encode('ascii', 'ignore').upper().translate(None, _NON_AA)
 
 
-def clean_peptide_sequence(sequence):
+def _clean_batch(rows):
     """
-    Clean peptide sequence by removing invalid characters
+    Clean a batch of (identifier, peptide) rows in a worker process
+
+    Returns the number of rows seen, the FASTA records of those long
+    enough to keep, and up to MAX_SKIPPED_SAMPLES (identifier, peptide)
+    pairs of the ones that weren't.
     """
-    # Remove common special characters
-    cleaned = sequence.replace('?', '').replace('*', '').replace('-', '').replace(' ', '').strip()
-    
-    # Convert to uppercase
-    cleaned = cleaned.upper()
-    
-    # Remove any remaining non-amino acid characters
-    cleaned = re.sub(r'[^ACDEFGHIKLMNPQRSTVWY]', '', cleaned)
-    
-    return cleaned
+    records = []
+    skipped = []
+    for identifier, peptide in rows:
+        clean_peptide = clean_peptide_sequence(peptide)
+        if len(clean_peptide) >= 3:
+            records.append(b'>%s\n%s\n' % (identifier.encode(), clean_peptide))
+        elif len(skipped) < MAX_SKIPPED_SAMPLES:
+            skipped.append((identifier, peptide[:20]))
+    return len(rows), records, skipped
+
+
+def read_cached_version(diamond_path):
+    """Return the cached DIAMOND version string, or None if it is missing or stale"""
+    try:
+        cached_at = os.path.getmtime(VERSION_CACHE)
+        if time.time() - cached_at > VERSION_CACHE_TTL or os.path.getmtime(diamond_path) > cached_at:
+            return None
+        with open(VERSION_CACHE) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
 
 
-def create_diamond_database(db_file='tmrna.db', output_prefix='peptide_db'):
+def write_cached_version(version):
+    try:
+        with open(VERSION_CACHE, 'w') as f:
+            f.write(version)
+    except OSError:
+        pass  # the cache is only an optimisation
+
+
+def diamond_block_size():
+    """
+    --block-size for blastp sized to the available RAM, or None to keep the default
+
+    DIAMOND uses roughly 6 GB per unit of block size, clamped here to [1, 12].
+    """
+    try:
+        available = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None  # no sysconf (e.g. Windows)
+    return str(min(12, max(1, available // (6 * 1024 ** 3))))
+
+
+def write_all(fd, data):
+    """os.write the whole buffer, looping over short writes; returns its length"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+    return len(data)
+
+
+def create_diamond_database(db_file='tmrna.db', output_prefix='peptide_db', keep_fasta=False, self_test=False):
     """
     Create DIAMOND database from SQLite peptide sequences
     
     Args:
         db_file: Path to SQLite database
         output_prefix: Output database prefix (will create peptide_db.dmnd)
+        keep_fasta: Also save the FASTA fed to makedb as peptide_db.fasta.gz
+        self_test: Run a sample blastp search against the new database
     """
     
     print("🚀 Creating DIAMOND database for peptide similarity search...")
@@ -60,98 +135,152 @@ def create_diamond_database(db_file='tmrna.db', output_prefix='peptide_db'):
         sys.exit(1)
     
     # Check if DIAMOND is installed
-    try:
-        result = subprocess.run(['diamond', 'version'], 
-                              capture_output=True, 
-                              text=True, 
-                              timeout=5)
-        print(f"✅ DIAMOND found: {result.stdout.strip()}")
-    except FileNotFoundError:
+    diamond_path = shutil.which('diamond')
+    if diamond_path is None:
         print("❌ Error: DIAMOND not found!")
         print("\n📥 Please install DIAMOND:")
         print("   Windows: Download from https://github.com/bbuchfink/diamond/releases")
         print("   Linux: wget http://github.com/bbuchfink/diamond/releases/download/v2.1.9/diamond-linux64.tar.gz")
         print("   Mac: brew install diamond")
         sys.exit(1)
-    except subprocess.TimeoutExpired:
-        print("⚠️  Warning: DIAMOND command timed out, but may be installed")
+    
+    version = read_cached_version(diamond_path)
+    if version is None:
+        try:
+            result = subprocess.run(['diamond', 'version'], 
+                                  capture_output=True, 
+                                  text=True, 
+                                  timeout=5)
+            version = result.stdout.strip()
+            if result.returncode == 0 and version:
+                write_cached_version(version)
+        except subprocess.TimeoutExpired:
+            print("⚠️  Warning: DIAMOND command timed out, but may be installed")
+    if version:
+        print(f"✅ DIAMOND found: {version}")
     
     # Connect to SQLite database
     conn = sqlite3.connect(db_file)
+    conn.execute('PRAGMA cache_size = -65536')
     cursor = conn.cursor()
     
-    # Fetch all peptide sequences
+    # Stream peptide sequences straight into the FASTA file. A plain table
+    # scan already returns rows in id order, so no ORDER BY is needed.
     print("📥 Extracting peptide sequences from database...")
+    
+    fasta_file = f"{output_prefix}.fasta.gz"
     cursor.execute('''
         SELECT identifier, tag_peptide 
-        FROM tmrna_data 
-        ORDER BY id
+        FROM tmrna_data
     ''')
     
-    sequences = cursor.fetchall()
-    conn.close()
-    
-    print(f"✅ Found {len(sequences):,} peptide sequences")
+    # makedb reads the FASTA from stdin while it is being generated, so no
+    # intermediate file is written unless keep_fasta asks for one. Its output
+    # goes to a temporary file so a chatty makedb can't fill a pipe and stall.
+    print("\n🔨 Building DIAMOND database (this may take 1-2 minutes)...")
+    makedb_log = tempfile.TemporaryFile()
+    makedb = subprocess.Popen([
+        'diamond', 'makedb',
+        '--in', '-',
+        '--db', output_prefix,
+        '--threads', DIAMOND_THREADS
+    ], stdin=subprocess.PIPE, stdout=makedb_log, stderr=subprocess.STDOUT)
+    writers = [partial(write_all, makedb.stdin.fileno())]
     
-    # Create FASTA file with validation
-    fasta_file = f"{output_prefix}.fasta"
-    print(f"📝 Writing FASTA file: {fasta_file}")
+    # The kept copy is gzip level 1 (fast, and about 3x smaller); makedb can
+    # read it back directly with --in peptide_db.fasta.gz. pigz compresses
+    # on all cores when installed, otherwise the gzip module does it inline.
+    pigz = None
+    fasta_gz = None
+    if keep_fasta:
+        print(f"📝 Writing FASTA file: {fasta_file}")
+        if shutil.which('pigz'):
+            with open(fasta_file, 'wb') as fasta_out:
+                pigz = subprocess.Popen(['pigz', '-1', '-c'], stdin=subprocess.PIPE, stdout=fasta_out)
+            writers.append(partial(write_all, pigz.stdin.fileno()))
+        else:
+            fasta_gz = gzip.open(fasta_file, 'wb', compresslevel=1)
+            writers.append(fasta_gz.write)
     
+    sequence_count = 0
     valid_count = 0
-    invalid_count = 0
     too_short_count = 0
+    first_record = None
+    skipped_samples = []
     
-    with open(fasta_file, 'w') as f:
-        for identifier, peptide in sequences:
-            # Clean peptide sequence
-            clean_peptide = clean_peptide_sequence(peptide)
-            
-            # Validate
-            if len(clean_peptide) < 3:
-                too_short_count += 1
-                continue
-            
-            if not is_valid_protein_sequence(clean_peptide):
-                invalid_count += 1
-                print(f"⚠️  Invalid sequence for {identifier}: {peptide[:20]}...")
-                continue
-            
-            # Write valid sequence
-            f.write(f">{identifier}\n{clean_peptide}\n")
-            valid_count += 1
-    
-    print(f"✅ FASTA file created with {valid_count:,} valid sequences")
-    if invalid_count > 0:
-        print(f"⚠️  Skipped {invalid_count} invalid sequences")
+    # Clean batches across all cores, consuming results in submission (and
+    # so table) order; the main process only has to write the records out.
+    # The next batch is fetched only once the oldest result is taken, so a
+    # fixed window of batches is in flight rather than the whole table. The
+    # chunks go straight to the pipes' file descriptors, skipping a
+    # userspace buffer.
+    workers = os.cpu_count() or 1
+    pending = deque()
+    buf = bytearray()
+    try:
+        with Pool(processes=workers) as pool:
+            while True:
+                while len(pending) < workers * BATCHES_PER_WORKER:
+                    rows = cursor.fetchmany(BATCH_SIZE)
+                    if not rows:
+                        break
+                    pending.append(pool.apply_async(_clean_batch, (rows,)))
+                if not pending:
+                    break
+                
+                row_count, records, skipped = pending.popleft().get()
+                sequence_count += row_count
+                valid_count += len(records)
+                skipped_samples += skipped[:MAX_SKIPPED_SAMPLES - len(skipped_samples)]
+                if first_record is None and records:
+                    first_record = records[0]
+                for record in records:
+                    buf += record
+                if len(buf) >= WRITE_BUFFER:
+                    for write in writers:
+                        write(buf)
+                    buf.clear()
+        for write in writers:
+            write(buf)
+    except BrokenPipeError:
+        pass  # makedb exited early; its exit status and output say why
+    finally:
+        makedb.stdin.close()
+        if pigz is not None:
+            pigz.stdin.close()
+            pigz.wait()
+        if fasta_gz is not None:
+            fasta_gz.close()
+    
+    conn.close()
+    too_short_count = sequence_count - valid_count
+    
+    print(f"✅ Found {sequence_count:,} peptide sequences")
+    print(f"✅ Sent {valid_count:,} valid sequences to makedb")
     if too_short_count > 0:
         print(f"⚠️  Skipped {too_short_count} sequences that were too short")
+        for identifier, peptide in skipped_samples:
+            print(f"   {identifier}: {peptide!r}")
+        if too_short_count > len(skipped_samples):
+            print(f"   ... and {too_short_count - len(skipped_samples)} more")
     
-    # Verify FASTA file
-    print("\n🔍 Verifying FASTA file...")
-    with open(fasta_file, 'r') as f:
-        lines = f.readlines()
-        if len(lines) < 2:
-            print("❌ Error: FASTA file is empty or invalid!")
-            sys.exit(1)
-        
-        # Show first few sequences
-        print("📄 First sequence in FASTA:")
-        for i, line in enumerate(lines[:4]):
-            print(f"   {line.strip()}")
+    if first_record is None:
+        makedb.kill()
+        print("❌ Error: No valid peptide sequences to index!")
+        sys.exit(1)
     
-    # Create DIAMOND database
-    print("\n🔨 Building DIAMOND database (this may take 1-2 minutes)...")
+    print("📄 First sequence:")
+    for line in first_record.decode().splitlines():
+        print(f"   {line}")
     
     try:
-        result = subprocess.run([
-            'diamond', 'makedb',
-            '--in', fasta_file,
-            '--db', output_prefix
-        ], capture_output=True, text=True, timeout=300)
+        returncode = makedb.wait(timeout=300)
+        makedb_log.seek(0)
+        makedb_output = makedb_log.read().decode(errors='replace')
         
-        if result.returncode == 0:
+        if returncode == 0:
             dmnd_file = f"{output_prefix}.dmnd"
-            if os.path.exists(dmnd_file):
+            if os.path.exists(dmnd_file) and os.path.getsize(dmnd_file) > 0:
                 size_mb = os.path.getsize(dmnd_file) / (1024 * 1024)
                 print("\n" + "="*50)
                 print("✅ DIAMOND DATABASE CREATED SUCCESSFULLY!")
@@ -161,60 +290,65 @@ def create_diamond_database(db_file='tmrna.db', output_prefix='peptide_db'):
                 print(f"📁 Location: {os.path.abspath(dmnd_file)}")
                 print("="*50)
                 
-                # Test the database with a real sequence
-                print("\n🧪 Testing DIAMOND database with real sequence...")
-                
-                # Get a sample sequence from the FASTA
-                with open(fasta_file, 'r') as f:
-                    lines = f.readlines()
-                    # Find first sequence (skip header)
-                    test_seq = None
-                    for line in lines[1:]:
-                        if not line.startswith('>'):
-                            test_seq = line.strip()
-                            break
+                # dbinfo only reads the database header, so it is a cheap sanity check
+                dbinfo = subprocess.run(['diamond', 'dbinfo', '--db', output_prefix],
+                                        capture_output=True, text=True, timeout=30)
+                if dbinfo.returncode == 0:
+                    for line in dbinfo.stdout.strip().splitlines():
+                        print(f"   {line}")
+                else:
+                    print("⚠️  diamond dbinfo could not read the database")
+                    if dbinfo.stderr:
+                        print(f"   Error: {dbinfo.stderr}")
                 
-                if test_seq and len(test_seq) >= 5:
-                    # Use first 10 characters or full sequence
-                    test_query = test_seq[:min(10, len(test_seq))]
-                    print(f"🧪 Test query: {test_query}")
+                if self_test:
+                    # Test the database with a real sequence
+                    print("\n🧪 Testing DIAMOND database with real sequence...")
                     
-                    test_file = "test_query.fasta"
-                    with open(test_file, 'w') as f:
-                        f.write(f">test\n{test_query}\n")
+                    # Use the first sequence that went into the database
+                    test_seq = first_record.split(b'\n')[1].decode()
                     
-                    test_result = subprocess.run([
-                        'diamond', 'blastp',
-                        '--query', test_file,
-                        '--db', output_prefix,
-                        '--outfmt', '6',
-                        '--max-target-seqs', '5',
-                        '--id', '30'
-                    ], capture_output=True, text=True, timeout=30)
+                    if test_seq and len(test_seq) >= 5:
+                        # Use first 10 characters or full sequence
+                        test_query = test_seq[:min(10, len(test_seq))]
+                        print(f"🧪 Test query: {test_query}")
+                        
+                        # The query goes in over stdin and hits come back on stdout
+                        blastp_cmd = [
+                            'diamond', 'blastp',
+                            '--query', '-',
+                            '--db', output_prefix,
+                            '--outfmt', '6',
+                            '--max-target-seqs', '5',
+                            '--id', '30',
+                            '--threads', DIAMOND_THREADS
+                        ]
+                        block_size = diamond_block_size()
+                        if block_size:
+                            blastp_cmd += ['--block-size', block_size]
+                        test_result = subprocess.run(blastp_cmd, input=f">test\n{test_query}\n",
+                                                     capture_output=True, text=True, timeout=30)
+                        
+                        if test_result.returncode == 0 and test_result.stdout:
+                            matches = len(test_result.stdout.strip().split('\n'))
+                            print(f"✅ DIAMOND test successful! Found {matches} matches")
+                            print(f"📊 Sample output:\n{test_result.stdout[:200]}")
+                        else:
+                            print("⚠️  DIAMOND test returned no matches")
+                            if test_result.stderr:
+                                print(f"   Error: {test_result.stderr}")
                     
-                    if test_result.returncode == 0 and test_result.stdout:
-                        matches = len(test_result.stdout.strip().split('\n'))
-                        print(f"✅ DIAMOND test successful! Found {matches} matches")
-                        print(f"📊 Sample output:\n{test_result.stdout[:200]}")
-                    else:
-                        print("⚠️  DIAMOND test returned no matches")
-                        if test_result.stderr:
-                            print(f"   Error: {test_result.stderr}")
-                    
-                    # Cleanup
-                    if os.path.exists(test_file):
-                        os.remove(test_file)
-                
                 print("\n✨ DIAMOND setup complete!")
                 print("📝 You can now use this database for peptide similarity searches")
             else:
                 print("❌ Error: DIAMOND database file was not created")
-                print(result.stderr)
+                print(makedb_output)
         else:
             print("❌ Error creating DIAMOND database:")
-            print(result.stderr)
+            print(makedb_output)
     
     except subprocess.TimeoutExpired:
+        makedb.kill()
         print("❌ Error: DIAMOND makedb command timed out")
         sys.exit(1)
     except Exception as e:
@@ -223,19 +357,25 @@ def create_diamond_database(db_file='tmrna.db', output_prefix='peptide_db'):
 
 
 if __name__ == '__main__':
+    # --keep-fasta also saves the (gzipped) FASTA next to the database,
+    # --self-test runs a sample search once it is built
+    keep_fasta = '--keep-fasta' in sys.argv[1:]
+    self_test = '--self-test' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg not in ('--keep-fasta', '--self-test')]
+    
     # Get database file from command line or use default
-    if len(sys.argv) > 1:
-        db_file = sys.argv[1]
+    if len(args) > 0:
+        db_file = args[0]
     else:
         db_file = 'tmrna.db'
     
     # Get output prefix from command line or use default
-    if len(sys.argv) > 2:
-        output_prefix = sys.argv[2]
+    if len(args) > 1:
+        output_prefix = args[1]
     else:
         output_prefix = 'peptide_db'
     
     # Make sure we're using absolute paths
     db_file = os.path.abspath(db_file)
     
-    create_diamond_database(db_file, output_prefix)
\ No newline at end of file
+    create_diamond_database(db_file, output_prefix, keep_fasta, self_test)
\ No newline at end of file
@@ -8,8 +8,136 @@ Run this script once to generate tmrna.db
 
 import sqlite3
 import csv
+import mmap
 import os
 import sys
+from operator import itemgetter
+
+# Rows between progress updates during the bulk import
+PROGRESS_EVERY = 100000
+
+# Whitespace Python's str.strip() would remove from a CSV field
+_SQL_WS = "' ' || char(9) || char(10) || char(13)"
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def import_csv_natively(cursor, csv_file_path, actual_cols):
+    """
+    Bulk-load the CSV through SQLite's csv virtual table, deriving organism
+    and accession in SQL the same way the Python loop does
+    
+    Returns the number of rows imported, or None if the csv extension can't
+    be loaded, in which case the caller parses the file in Python. Rows with
+    missing columns are skipped and counted, as in the Python loop.
+    """
+    conn = cursor.connection
+    # Python builds without loadable-extension support lack the method
+    if not hasattr(conn, 'enable_load_extension'):
+        return None
+    conn.enable_load_extension(True)
+    try:
+        conn.load_extension('csv')
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.enable_load_extension(False)
+    
+    print("⚡ Loading CSV with SQLite's csv module...")
+    cursor.execute(
+        "CREATE VIRTUAL TABLE temp.csv_in USING csv(filename='%s', header=YES)"
+        % csv_file_path.replace("'", "''")
+    )
+    fields = ', '.join(
+        f"trim({_quote_identifier(actual_cols[name])}, {_SQL_WS}) AS {name}"
+        for name in ('identifier', 'tag_peptide', 'codons', 'tmrna_sequence')
+    )
+    
+    # The csv module fills the columns a short row lacks with NULL; the
+    # counter is only called for those rows, so complete rows stay in SQL
+    skipped = 0
+    def skip_row():
+        nonlocal skipped
+        skipped += 1
+        return 0
+    conn.create_function('skip_row', 0, skip_row)
+    
+    cursor.execute(f'''
+        INSERT INTO tmrna_data 
+        (identifier, tag_peptide, codons, tmrna_sequence, 
+         organism_name, accession)
+        SELECT identifier, tag_peptide, codons, tmrna_sequence,
+               CASE WHEN instr(identifier, ' ')
+                    THEN substr(identifier, length(rtrim(identifier, replace(identifier, ' ', ''))) + 1)
+                    ELSE '' END,
+               CASE WHEN instr(identifier, '_')
+                    THEN substr(identifier, 1, instr(identifier, '_') - 1)
+                    ELSE identifier END
+        FROM (SELECT {fields} FROM temp.csv_in)
+        WHERE CASE WHEN identifier IS NULL OR tag_peptide IS NULL
+                        OR codons IS NULL OR tmrna_sequence IS NULL
+                   THEN skip_row() ELSE 1 END
+    ''')
+    count = cursor.rowcount
+    cursor.execute('DROP TABLE temp.csv_in')
+    
+    if skipped:
+        print(f"\n⚠️  Warning: Skipped {skipped} rows with missing columns")
+    return count
+
+def iter_tsv_rows(csv_file_path):
+    """
+    Yield the data rows of an unquoted tab-separated file as field lists,
+    scanning it through mmap instead of the csv module
+    """
+    with open(csv_file_path, 'rb') as raw, mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.readline()  # header
+        for line in iter(mm.readline, b''):
+            yield line.decode('utf-8').rstrip('\r\n').split('\t')
+
+def iter_records(rows, pick_columns):
+    """
+    Yield insert tuples for the CSV data rows, skipping blank lines and
+    warning about rows that can't be parsed
+    """
+    count = 0
+    for row in rows:
+        if not row or row == ['']:
+            continue  # blank line
+        try:
+            identifier, tag_peptide, codons, tmrna_sequence = pick_columns(row)
+            identifier = identifier.strip()
+            tag_peptide = tag_peptide.strip()
+            codons = codons.strip()
+            tmrna_sequence = tmrna_sequence.strip()
+            
+            # Extract organism name (usually last word in identifier)
+            space = identifier.rfind(' ')
+            organism = identifier[space + 1:] if space != -1 else ''
+            
+            # Extract accession (usually first part before _)
+            underscore = identifier.find('_')
+            accession = identifier[:underscore] if underscore != -1 else identifier
+        
+        except IndexError as e:
+            print(f"\n⚠️  Warning: Skipping row due to missing column: {e}")
+            continue
+        except Exception as e:
+            print(f"\n⚠️  Warning: Error processing row: {e}")
+            continue
+        
+        yield (
+            identifier,
+            tag_peptide,
+            codons,
+            tmrna_sequence,
+            organism,
+            accession
+        )
+        
+        count += 1
+        if count % PROGRESS_EVERY == 0:
+            print(f"   Imported {count} records...", end='\r')
 
 def create_database(csv_file_path, db_file_path='tmrna.db'):
     """
@@ -33,6 +161,18 @@ def create_database(csv_file_path, db_file_path='tmrna.db'):
     conn = sqlite3.connect(db_file_path)
     cursor = conn.cursor()
     
+    # The file is rebuilt from scratch on failure, so skip fsyncs and keep the
+    # rollback journal and temp b-trees in memory; the index and FTS builds
+    # then never write a journal to disk. journal_mode=MEMORY isn't
+    # persisted, so the finished file is still a plain rollback-journal
+    # database that sql.js can load (unlike WAL). Reads during the index,
+    # FTS, ANALYZE and VACUUM passes go through a 256 MiB memory map.
+    cursor.execute('PRAGMA journal_mode = MEMORY')
+    cursor.execute('PRAGMA synchronous = OFF')
+    cursor.execute('PRAGMA temp_store = MEMORY')
+    cursor.execute('PRAGMA cache_size = -262144')
+    cursor.execute('PRAGMA mmap_size = 268435456')
+    
     # Create main table
     print("📊 Creating main table...")
     cursor.execute('''
@@ -44,31 +184,17 @@ def create_database(csv_file_path, db_file_path='tmrna.db'):
             tmrna_sequence TEXT NOT NULL,
             organism_name TEXT,
             accession TEXT,
-            peptide_length INTEGER,
-            sequence_length INTEGER
-        )
-    ''')
-    
-    # Create indexes for fast lookups
-    print("🔍 Creating indexes...")
-    cursor.execute('CREATE INDEX idx_identifier ON tmrna_data(identifier)')
-    cursor.execute('CREATE INDEX idx_organism ON tmrna_data(organism_name)')
-    cursor.execute('CREATE INDEX idx_accession ON tmrna_data(accession)')
-    
-    # Create FTS5 virtual table for full-text search (SUPER FAST!)
-    print("⚡ Creating FTS5 full-text search index...")
-    cursor.execute('''
-        CREATE VIRTUAL TABLE IF NOT EXISTS tmrna_fts USING fts5(
-            identifier,
-            organism_name,
-            accession,
-            content='tmrna_data',
-            content_rowid='id'
+            peptide_length INTEGER GENERATED ALWAYS AS (
+                length(replace(replace(tag_peptide, '?', ''), '*', ''))
+            ) STORED,
+            sequence_length INTEGER GENERATED ALWAYS AS (length(tmrna_sequence)) STORED
         )
     ''')
     
-    # Import CSV data
+    # Import CSV data in one transaction; indexes and FTS are built afterwards
+    # so the inserts only maintain the table itself
     print("📥 Importing CSV data...")
+    cursor.execute('BEGIN')
     
     try:
         with open(csv_file_path, 'r', encoding='utf-8') as f:
@@ -78,12 +204,12 @@ def create_database(csv_file_path, db_file_path='tmrna.db'):
             
             # Detect if comma or tab separated
             if '\t' in sample:
-                reader = csv.DictReader(f, delimiter='\t')
+                reader = csv.reader(f, delimiter='\t')
             else:
-                reader = csv.DictReader(f)
+                reader = csv.reader(f)
             
             # Get field names
-            fieldnames = reader.fieldnames
+            fieldnames = next(reader, None)
             print(f"📋 CSV columns detected: {fieldnames}")
             
             # Map common column name variations
@@ -110,76 +236,35 @@ def create_database(csv_file_path, db_file_path='tmrna.db'):
             
             print(f"✅ Column mapping: {actual_cols}")
             
-            # Reset file pointer
-            f.seek(0)
-            if '\t' in sample:
-                reader = csv.DictReader(f, delimiter='\t')
-            else:
-                reader = csv.DictReader(f)
-            
-            count = 0
-            batch = []
-            batch_size = 1000
+            count = None
+            if '\t' not in sample:
+                # SQLite's csv module only reads comma-separated files
+                count = import_csv_natively(cursor, csv_file_path, actual_cols)
             
-            for row in reader:
-                try:
-                    identifier = row[actual_cols['identifier']].strip()
-                    tag_peptide = row[actual_cols['tag_peptide']].strip()
-                    codons = row[actual_cols['codons']].strip()
-                    tmrna_sequence = row[actual_cols['tmrna_sequence']].strip()
-                    
-                    # Extract organism name (usually last word in identifier)
-                    parts = identifier.split()
-                    organism = parts[-1] if len(parts) > 1 else ''
-                    
-                    # Extract accession (usually first part before _)
-                    accession = identifier.split('_')[0] if '_' in identifier else identifier
-                    
-                    # Calculate lengths
-                    peptide_length = len(tag_peptide.replace('?', '').replace('*', ''))
-                    sequence_length = len(tmrna_sequence)
-                    
-                    batch.append((
-                        identifier,
-                        tag_peptide,
-                        codons,
-                        tmrna_sequence,
-                        organism,
-                        accession,
-                        peptide_length,
-                        sequence_length
-                    ))
-                    
-                    count += 1
-                    
-                    # Insert in batches for performance
-                    if len(batch) >= batch_size:
-                        cursor.executemany('''
-                            INSERT INTO tmrna_data 
-                            (identifier, tag_peptide, codons, tmrna_sequence, 
-                             organism_name, accession, peptide_length, sequence_length)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', batch)
-                        conn.commit()
-                        batch = []
-                        print(f"   Imported {count} records...", end='\r')
+            if count is None:
+                # Resolve the column positions once; rows are plain lists
+                pick_columns = itemgetter(*[
+                    fieldnames.index(actual_cols[name])
+                    for name in ('identifier', 'tag_peptide', 'codons', 'tmrna_sequence')
+                ])
                 
-                except KeyError as e:
-                    print(f"\n⚠️  Warning: Skipping row due to missing column: {e}")
-                    continue
-                except Exception as e:
-                    print(f"\n⚠️  Warning: Error processing row: {e}")
-                    continue
-            
-            # Insert remaining batch
-            if batch:
+                if '\t' in sample and '"' not in sample:
+                    # Plain TSV without quoting: split lines straight off the mapped file
+                    rows = iter_tsv_rows(csv_file_path)
+                else:
+                    # Keep reading after the header line
+                    rows = reader
+                
+                # One executemany consumes the whole file; rows stream
+                # straight from the reader without an intermediate batch
                 cursor.executemany('''
                     INSERT INTO tmrna_data 
                     (identifier, tag_peptide, codons, tmrna_sequence, 
-                     organism_name, accession, peptide_length, sequence_length)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', batch)
-                conn.commit()
+                     organism_name, accession)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', iter_records(rows, pick_columns))
+                count = cursor.rowcount
+            conn.commit()
             
             print(f"\n✅ Successfully imported {count} records!")
     
@@ -190,14 +275,35 @@ def create_database(csv_file_path, db_file_path='tmrna.db'):
         print(f"❌ Error reading CSV: {e}")
         sys.exit(1)
     
-    # Populate FTS5 index
-    print("🔍 Populating full-text search index...")
+    # Create indexes for fast lookups
+    print("🔍 Creating indexes...")
+    cursor.execute('CREATE INDEX idx_identifier ON tmrna_data(identifier)')
+    cursor.execute('CREATE INDEX idx_organism ON tmrna_data(organism_name)')
+    cursor.execute('CREATE INDEX idx_accession ON tmrna_data(accession)')
+    
+    # Create FTS5 virtual table for full-text search (SUPER FAST!)
+    print("⚡ Creating FTS5 full-text search index...")
     cursor.execute('''
-        INSERT INTO tmrna_fts(rowid, identifier, organism_name, accession)
-        SELECT id, identifier, organism_name, accession FROM tmrna_data
+        CREATE VIRTUAL TABLE IF NOT EXISTS tmrna_fts USING fts5(
+            identifier,
+            organism_name,
+            accession,
+            content='tmrna_data',
+            content_rowid='id'
+        )
     ''')
+    
+    # Populate FTS5 index from its content table, then merge the segments
+    # into one b-tree for faster MATCH queries
+    print("🔍 Populating full-text search index...")
+    cursor.execute("INSERT INTO tmrna_fts(tmrna_fts) VALUES('rebuild')")
+    cursor.execute("INSERT INTO tmrna_fts(tmrna_fts) VALUES('optimize')")
     conn.commit()
     
+    # Refresh planner statistics and compact the file
+    cursor.execute('ANALYZE')
+    cursor.execute('VACUUM')
+    
     # Get statistics
     cursor.execute('SELECT COUNT(*) FROM tmrna_data')
     total_records = cursor.fetchone()[0]